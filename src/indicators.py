@@ -0,0 +1,565 @@
+from typing import Iterable
+from collections import deque
+import math
+import re
+import numpy as np
+import pandas as pd
+import kernels
+
+"""
+Indicator specifications.
+
+Indicator names such as 'ema20', 'd_ema200' or 'boll20,2.0' are parsed
+into nodes which name the columns they depend on. plan() resolves the
+nodes for a set of requested indicators into a single dependency graph,
+so shared nodes are only evaluated once, in dependency order.
+"""
+
+RAW_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+class Indicator:
+    """
+    A node in the indicator graph.
+
+    name (str): The canonical name, which is also the column it produces.
+    inputs (tuple): The names of the columns it is computed from.
+    version (int): Increased whenever the calculation changes, so values
+                   stored by an older version are recomputed.
+    """
+    version = 1
+
+    def __init__(self, name: str, inputs: tuple = ()):
+        self.name   = name
+        self.inputs = inputs
+
+    @property
+    def produces_column(self) -> bool:
+        return True
+
+    def compute(self, columns: dict) -> np.ndarray:
+        raise NotImplementedError
+
+    def extend(self, values: np.ndarray, columns: dict) -> np.ndarray:
+        """
+        Compute the bars after `values` from the last value, rather than
+        recomputing the full history.
+
+        Returns:
+        np.ndarray: The new values, or None if this indicator cannot be extended.
+        """
+        return None
+
+    def online(self) -> 'Online':
+        """
+        Returns:
+        Online: Empty state for updating this indicator one bar at a time.
+        """
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+class Column(Indicator):
+    """
+    A downloaded column such as 'Close', only valid if it already exists.
+    """
+    def compute(self, columns: dict) -> np.ndarray:
+        raise ValueError(f"Missing column: {self.name}")
+
+class Ema(Indicator):
+    def __init__(self, period: int, source: str = 'Close'):
+        super().__init__(f"ema{period}", (source, ))
+        self.period = period
+
+    def online(self) -> 'Online':
+        return OnlineEma(self)
+
+    def compute(self, columns: dict) -> np.ndarray:
+        return kernels.ema(columns[self.inputs[0]], self.period)
+
+    def extend(self, values: np.ndarray, columns: dict) -> np.ndarray:
+        # The recurrence continues from the last value
+        bars = values.size
+        seeded = np.concatenate(([values[-1]], columns[self.inputs[0]][bars:]))
+        return kernels.ema(seeded, self.period, use_min_periods=False)[1:]
+
+class Sma(Indicator):
+    def __init__(self, period: int, source: str = 'Close'):
+        super().__init__(f"sma{period}", (source, ))
+        self.period = period
+
+    def online(self) -> 'Online':
+        return OnlineSma(self)
+
+    def compute(self, columns: dict) -> np.ndarray:
+        return kernels.rolling_mean(columns[self.inputs[0]].astype(np.float64, copy=False),
+                                    self.period)
+
+class Std(Indicator):
+    """
+    Rolling (population) standard deviation.
+    """
+    def __init__(self, period: int, source: str = 'Close'):
+        super().__init__(f"std{period}", (source, ))
+        self.period = period
+
+    def online(self) -> 'Online':
+        return OnlineStd(self)
+
+    def compute(self, columns: dict) -> np.ndarray:
+        return kernels.rolling_std(columns[self.inputs[0]].astype(np.float64, copy=False),
+                                   self.period)
+
+class Extreme(Indicator):
+    """
+    Rolling high or low of the last `period` bars, including the current
+    bar. The first bars use however many bars are available, so
+    close == high<N> marks a new N day high from the start of the data.
+    """
+    def __init__(self, kind: str, period: int, source: str = 'Close'):
+        super().__init__(f"{kind}{period}", (source, ))
+        self.maximum = kind == 'high'
+        self.period  = period
+
+    def online(self) -> 'Online':
+        return OnlineExtreme(self)
+
+    def compute(self, columns: dict) -> np.ndarray:
+        return kernels.rolling_extreme(columns[self.inputs[0]].astype(np.float64, copy=False),
+                                       self.period,
+                                       self.maximum)
+
+    def extend(self, values: np.ndarray, columns: dict) -> np.ndarray:
+        # Only the window before the new bars is needed
+        bars = values.size
+        start = max(bars - self.period + 1, 0)
+        window = columns[self.inputs[0]][start:].astype(np.float64, copy=False)
+        return kernels.rolling_extreme(window, self.period, self.maximum)[bars - start:]
+
+class TrueRange(Indicator):
+    def __init__(self):
+        super().__init__('tr', ('High', 'Low', 'Close'))
+
+    def online(self) -> 'Online':
+        return OnlineTrueRange(self)
+
+    def compute(self, columns: dict) -> np.ndarray:
+        high, low, close = (columns[i].astype(np.float64, copy=False) for i in self.inputs)
+        return kernels.true_range(high, low, close)
+
+    def extend(self, values: np.ndarray, columns: dict) -> np.ndarray:
+        # Starting from the last stored bar supplies the previous close
+        high, low, close = (columns[i][values.size - 1:].astype(np.float64, copy=False)
+                            for i in self.inputs)
+        return kernels.true_range(high, low, close)[1:]
+
+class Atr(Indicator):
+    """
+    Average true range with Wilder's smoothing.
+    """
+    version = 2
+
+    def __init__(self, period: int):
+        super().__init__(f"atr{period}", ('tr', ))
+        self.period = period
+
+    def online(self) -> 'Online':
+        return OnlineAtr(self)
+
+    def compute(self, columns: dict) -> np.ndarray:
+        return kernels.wilder_atr(columns['tr'], self.period)
+
+    def extend(self, values: np.ndarray, columns: dict) -> np.ndarray:
+        return kernels.wilder_atr(columns['tr'][values.size:], self.period, values[-1])
+
+class Differential(Indicator):
+    def __init__(self, primary: str):
+        super().__init__('d_' + primary, (primary, ))
+
+    def online(self) -> 'Online':
+        return OnlineDifferential(self)
+
+    def compute(self, columns: dict) -> np.ndarray:
+        return pd.Series(columns[self.inputs[0]]).diff().to_numpy()
+
+    def extend(self, values: np.ndarray, columns: dict) -> np.ndarray:
+        # Differences only need the previous bar
+        return np.diff(columns[self.inputs[0]][values.size - 1:])
+
+class BollBand(Indicator):
+    """
+    Upper (+) or lower (-) Bollinger band, sd standard deviations from the sma.
+    """
+    def __init__(self, sign: str, period: int, sd: float):
+        super().__init__(f"boll{sign}{period},{sd:.1f}",
+                         (f"sma{period}", f"std{period}"))
+        self.sign = 1 if sign == '+' else -1
+        self.sd   = sd
+
+    def online(self) -> 'Online':
+        return OnlineBollBand(self)
+
+    def compute(self, columns: dict) -> np.ndarray:
+        sma, std = (columns[i] for i in self.inputs)
+        return sma + self.sign * self.sd * std
+
+class Boll(Indicator):
+    """
+    Both Bollinger bands. Produces no column of its own.
+    """
+    def __init__(self, period: int = 20, sd: float = 2):
+        super().__init__(f"boll{period},{sd:.1f}",
+                         (f"boll+{period},{sd:.1f}", f"boll-{period},{sd:.1f}"))
+
+    @property
+    def produces_column(self) -> bool:
+        return False
+
+    def compute(self, columns: dict) -> np.ndarray:
+        return None
+
+PERIOD = r'([1-9][0-9]*)'
+NUMBER = r'([0-9]+(?:\.[0-9]+)?)'
+
+# Indicator grammar, tried in order
+GRAMMAR = (
+    (re.compile(f"ema{PERIOD}"),            lambda m: Ema(int(m[1]))),
+    (re.compile(f"sma{PERIOD}"),            lambda m: Sma(int(m[1]))),
+    (re.compile(f"std{PERIOD}"),            lambda m: Std(int(m[1]))),
+    (re.compile(f"(high|low){PERIOD}"),     lambda m: Extreme(m[1], int(m[2]))),
+    (re.compile(r"tr"),                     lambda m: TrueRange()),
+    (re.compile(r"atr"),                    lambda m: Atr(14)),
+    (re.compile(f"atr{PERIOD}"),            lambda m: Atr(int(m[1]))),
+    (re.compile(r"d_(.+)"),                 lambda m: Differential(parse(m[1]).name)),
+    (re.compile(r"boll"),                   lambda m: Boll()),
+    (re.compile(f"boll{PERIOD},{NUMBER}"),  lambda m: Boll(int(m[1]), float(m[2]))),
+    (re.compile(f"boll([+-]){PERIOD},{NUMBER}"),
+                                            lambda m: BollBand(m[1], int(m[2]), float(m[3]))),
+)
+
+def parse(name: str) -> Indicator:
+    """
+    Parse an indicator name into its node.
+
+    Raises:
+    ValueError: If the name is not a valid indicator.
+    """
+    if name in RAW_COLUMNS:
+        return Column(name)
+
+    for pattern, node in GRAMMAR:
+        match = pattern.fullmatch(name)
+        if match is not None:
+            return node(match)
+
+    raise ValueError(f"Unknown indicator: {name}")
+
+def plan(names: Iterable, available: Iterable = ()) -> list:
+    """
+    Resolve the indicators needed to compute `names`, skipping any which
+    are already available, into a deduplicated list in dependency order.
+
+    Raises:
+    ValueError: If any name, or any indicator it depends on, is invalid.
+    """
+    available = set(available)
+    nodes = {}
+
+    def visit(name: str):
+        if name in available or name in nodes:
+            return
+        node = parse(name)
+        if node.name in available or node.name in nodes:
+            return
+        for input_name in node.inputs:
+            visit(input_name)
+        if isinstance(node, Column):
+            node.compute({})
+        nodes[node.name] = node
+
+    for name in names:
+        visit(name)
+    return list(nodes.values())
+
+class Online:
+    """
+    State of an indicator which is updated one bar at a time in O(1),
+    for live and end of day updates without recomputing the history.
+    """
+    # Bars of history needed to rebuild the state, None for all of them
+    lookback = None
+
+    def __init__(self, node: Indicator):
+        self.node  = node
+        self.name  = node.name
+        self.value = math.nan
+
+    def update(self, bar: dict) -> float:
+        """
+        Parameters:
+        bar (dict): Values of the new bar keyed by column, including the
+                    new values of every indicator this one depends on.
+
+        Returns:
+        float: The new value of the indicator.
+        """
+        raise NotImplementedError
+
+    def seed(self, columns: dict) -> 'Online':
+        """
+        Continue from a finished batch computation by replaying the last
+        bars it was computed from.
+        """
+        bars = len(columns[self.node.inputs[0]]) if len(self.node.inputs) > 0 else 0
+        start = 0 if self.lookback is None else max(bars - self.lookback, 0)
+        for i in range(start, bars):
+            self.update({column: columns[column][i] for column in self.node.inputs})
+        return self
+
+class OnlineEma(Online):
+    def __init__(self, node: Ema):
+        super().__init__(node)
+        self.source       = node.inputs[0]
+        self.alpha        = 1.0 / (1.0 + (node.period - 1.0) / 2.0)
+        self.weighted     = math.nan
+        self.old_weight   = 1.0
+        self.observations = 0
+
+    def update(self, bar: dict) -> float:
+        # Same recurrence as kernels.ema_bank
+        current = bar[self.source]
+        is_observation = current == current
+        self.observations += is_observation
+
+        if self.weighted == self.weighted:
+            self.old_weight *= 1.0 - self.alpha
+            if is_observation:
+                if self.weighted != current:
+                    self.weighted = ((self.old_weight * self.weighted + self.alpha * current)
+                                  /  (self.old_weight + self.alpha))
+                self.old_weight = 1.0
+        elif is_observation:
+            self.weighted = current
+
+        self.value = self.weighted if self.observations >= self.node.period else math.nan
+        return self.value
+
+    def seed(self, columns: dict) -> Online:
+        values = columns[self.source]
+        ema = columns.get(self.name)
+        # The last value is the full state once the average is defined
+        if (ema is not None
+        and len(ema) == len(values)
+        and len(ema) > 0
+        and ema[-1] == ema[-1]
+        and values[-1] == values[-1]):
+            self.weighted     = ema[-1]
+            self.value        = ema[-1]
+            self.observations = int(np.count_nonzero(values == values))
+            return self
+        return super().seed(columns)
+
+class OnlineSma(Online):
+    def __init__(self, node: Sma):
+        super().__init__(node)
+        self.source       = node.inputs[0]
+        self.lookback     = node.period
+        self.window       = deque()
+        self.total        = 0.0
+        self.observations = 0
+
+    def update(self, bar: dict) -> float:
+        current = bar[self.source]
+        self.window.append(current)
+        if current == current:
+            self.total += current
+            self.observations += 1
+        if len(self.window) > self.node.period:
+            old = self.window.popleft()
+            if old == old:
+                self.total -= old
+                self.observations -= 1
+
+        self.value = (self.total / self.node.period
+                      if self.observations == self.node.period else math.nan)
+        return self.value
+
+class OnlineStd(Online):
+    def __init__(self, node: Std):
+        super().__init__(node)
+        self.source       = node.inputs[0]
+        self.lookback     = node.period
+        self.window       = deque()
+        self.mean         = 0.0
+        self.squares      = 0.0
+        self.compensation = 0.0
+        self.observations = 0
+
+    def add(self, value: float, sign: int):
+        # Same compensated update as kernels.rolling_std
+        prev_mean = self.mean - self.compensation
+        y = value - self.compensation
+        t = y - self.mean
+        self.compensation = t + self.mean - y
+        self.mean += sign * t / self.observations
+        self.squares += sign * (value - prev_mean) * (value - self.mean)
+
+    def update(self, bar: dict) -> float:
+        current = bar[self.source]
+        self.window.append(current)
+        if current == current:
+            self.observations += 1
+            self.add(current, 1)
+        if len(self.window) > self.node.period:
+            old = self.window.popleft()
+            if old == old:
+                self.observations -= 1
+                if self.observations > 0:
+                    self.add(old, -1)
+                else:
+                    self.mean = self.squares = self.compensation = 0.0
+
+        self.value = (math.sqrt(max(self.squares, 0.0) / self.node.period)
+                      if self.observations == self.node.period else math.nan)
+        return self.value
+
+class OnlineExtreme(Online):
+    def __init__(self, node: Extreme):
+        super().__init__(node)
+        self.source   = node.inputs[0]
+        self.lookback = node.period
+        self.deque    = deque()     # (bar, value) with monotonic values
+        self.bar      = 0
+
+    def update(self, bar: dict) -> float:
+        current = bar[self.source]
+        if len(self.deque) > 0 and self.deque[0][0] <= self.bar - self.node.period:
+            self.deque.popleft()
+
+        if current == current:
+            while (len(self.deque) > 0
+               and ((self.deque[-1][1] <= current) if self.node.maximum
+                    else (self.deque[-1][1] >= current))):
+                self.deque.pop()
+            self.deque.append((self.bar, current))
+
+        self.bar += 1
+        self.value = self.deque[0][1] if len(self.deque) > 0 else math.nan
+        return self.value
+
+class OnlineTrueRange(Online):
+    lookback = 1
+
+    def __init__(self, node: TrueRange):
+        super().__init__(node)
+        self.prev_close = math.nan
+
+    def update(self, bar: dict) -> float:
+        high, low, close = (bar[i] for i in self.node.inputs)
+        if self.prev_close != self.prev_close:
+            self.value = high - low
+        else:
+            self.value = max(high - low,
+                             abs(high - self.prev_close),
+                             abs(low - self.prev_close))
+        self.prev_close = close
+        return self.value
+
+class OnlineAtr(Online):
+    def __init__(self, node: Atr):
+        super().__init__(node)
+        self.atr          = math.nan
+        self.total        = 0.0
+        self.observations = 0
+
+    def update(self, bar: dict) -> float:
+        # Same recurrence as kernels.wilder_atr
+        tr = bar['tr']
+        period = self.node.period
+        if self.atr == self.atr:
+            if tr == tr:
+                self.atr = (self.atr * (period - 1) + tr) / period
+            self.value = self.atr
+        elif tr == tr:
+            self.total += tr
+            self.observations += 1
+            if self.observations == period:
+                self.atr = self.total / period
+                self.value = self.atr
+        return self.value
+
+    def seed(self, columns: dict) -> Online:
+        atr = columns.get(self.name)
+        if atr is not None and len(atr) > 0 and atr[-1] == atr[-1]:
+            self.atr   = atr[-1]
+            self.value = atr[-1]
+            return self
+        return super().seed(columns)
+
+class OnlineDifferential(Online):
+    lookback = 1
+
+    def __init__(self, node: Differential):
+        super().__init__(node)
+        self.source = node.inputs[0]
+        self.previous = math.nan
+
+    def update(self, bar: dict) -> float:
+        current = bar[self.source]
+        self.value = current - self.previous
+        self.previous = current
+        return self.value
+
+class OnlineBollBand(Online):
+    lookback = 0
+
+    def update(self, bar: dict) -> float:
+        sma, std = (bar[i] for i in self.node.inputs)
+        self.value = sma + self.node.sign * self.node.sd * std
+        return self.value
+
+class OnlineIndicators:
+    """
+    Online state for a set of indicators and everything they depend on,
+    updated together one bar at a time.
+    """
+    def __init__(self, names: Iterable, columns: dict = None):
+        """
+        Parameters:
+        names (Iterable): Indicator names, as for plan().
+        columns (dict): Batch computed columns to continue from, e.g.
+                        StockData.columns after preprocessing the indicators.
+                        None to start with empty state.
+        """
+        self.names = [name for name in names if isinstance(name, str)]
+        self.states = []
+        for node in plan(self.names, RAW_COLUMNS):
+            if not node.produces_column:
+                continue
+            state = node.online()
+            if columns is not None:
+                state.seed(columns)
+            self.states.append(state)
+
+        # Alternative names, e.g. atr for atr14, resolved once rather than per bar
+        self.aliases = []
+        for name in dict.fromkeys(self.names):
+            node = parse(name)
+            if node.produces_column and node.name != name and name not in RAW_COLUMNS:
+                self.aliases.append((name, node.name))
+
+    def update(self, bar: dict) -> dict:
+        """
+        Parameters:
+        bar (dict): The new bar, e.g. {'High': ..., 'Low': ..., 'Close': ...}.
+
+        Returns:
+        dict: The bar with the new value of every indicator added.
+        """
+        values = dict(bar)
+        for state in self.states:
+            values[state.name] = state.update(values)
+
+        for name, canonical in self.aliases:
+            values[name] = values[canonical]
+        return values
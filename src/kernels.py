@@ -0,0 +1,673 @@
+import numpy as np
+import numba
+
+"""
+Compiled array kernels used by indicators and backtests.
+
+Kernels take and return plain NumPy arrays so they can be called from
+StockData, strategies or other kernels without any pandas overhead.
+They are compiled with numba's on-disk cache so only the first run on a
+machine pays the compile time.
+"""
+
+@numba.njit(cache=True)
+def ema_bank(values: np.ndarray,
+             spans: np.ndarray,
+             use_min_periods: bool = True) -> np.ndarray:
+    """
+    Exponential moving averages for many spans in a single pass.
+
+    Matches pandas' Series.ewm(span=span, adjust=False,
+    min_periods=span).mean() exactly, including its handling of NaN.
+
+    Parameters:
+    values (np.ndarray): The series to average, e.g. close prices.
+    spans (np.ndarray): The span of each average.
+    use_min_periods (bool): Output NaN until `span` observations have been seen.
+
+    Returns:
+    np.ndarray: Array of shape (bars, spans).
+    """
+    bars = values.size
+    count = spans.size
+    out = np.empty((bars, count), dtype=np.float64)
+    if bars == 0:
+        return out
+
+    alpha = np.empty(count, dtype=np.float64)
+    min_periods = np.empty(count, dtype=np.int64)
+    for k in range(count):
+        alpha[k] = 1.0 / (1.0 + (spans[k] - 1.0) / 2.0)
+        min_periods[k] = max(spans[k], 1) if use_min_periods else 1
+
+    weighted = np.full(count, values[0], dtype=np.float64)
+    old_weight = np.ones(count, dtype=np.float64)
+    observations = 1 if values[0] == values[0] else 0
+    for k in range(count):
+        out[0, k] = weighted[k] if observations >= min_periods[k] else np.nan
+
+    for i in range(1, bars):
+        current = values[i]
+        is_observation = current == current
+        observations += is_observation
+
+        for k in range(count):
+            if weighted[k] == weighted[k]:
+                # Missing values decay the old weight until the next observation
+                old_weight[k] *= 1.0 - alpha[k]
+                if is_observation:
+                    if weighted[k] != current:
+                        weighted[k] = ((old_weight[k] * weighted[k] + alpha[k] * current)
+                                    /  (old_weight[k] + alpha[k]))
+                    old_weight[k] = 1.0
+            elif is_observation:
+                weighted[k] = current
+
+            out[i, k] = weighted[k] if observations >= min_periods[k] else np.nan
+
+    return out
+
+def ema(values: np.ndarray, span: int, use_min_periods: bool = True) -> np.ndarray:
+    return ema_bank(np.asarray(values, dtype=np.float64),
+                    np.array([span], dtype=np.int64),
+                    use_min_periods)[:, 0]
+
+@numba.njit(cache=True)
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Simple moving average using a running sum, O(1) per bar.
+    NaN until the window holds `window` observations.
+    """
+    bars = values.size
+    out = np.full(bars, np.nan)
+    total = 0.0
+    observations = 0
+
+    for i in range(bars):
+        if values[i] == values[i]:
+            total += values[i]
+            observations += 1
+        if i >= window:
+            old = values[i - window]
+            if old == old:
+                total -= old
+                observations -= 1
+        if observations == window:
+            out[i] = total / window
+
+    return out
+
+@numba.njit(cache=True)
+def rolling_std(values: np.ndarray, window: int, ddof: int = 0) -> np.ndarray:
+    """
+    Rolling standard deviation, O(1) per bar. The running mean and sum of
+    squared deviations are updated as values enter and leave the window
+    (with Kahan compensation on the mean), which avoids the cancellation
+    of a naive sum of squares. NaN until the window is full.
+    """
+    bars = values.size
+    out = np.full(bars, np.nan)
+    mean = 0.0
+    squares = 0.0
+    compensation = 0.0
+    observations = 0
+
+    for i in range(bars):
+        # Add the value entering the window
+        current = values[i]
+        if current == current:
+            observations += 1
+            prev_mean = mean - compensation
+            y = current - compensation
+            t = y - mean
+            compensation = t + mean - y
+            mean += t / observations
+            squares += (current - prev_mean) * (current - mean)
+
+        # Remove the value leaving the window
+        if i >= window:
+            old = values[i - window]
+            if old == old:
+                observations -= 1
+                if observations > 0:
+                    prev_mean = mean - compensation
+                    y = old - compensation
+                    t = y - mean
+                    compensation = t + mean - y
+                    mean -= t / observations
+                    squares -= (old - prev_mean) * (old - mean)
+                else:
+                    mean = 0.0
+                    squares = 0.0
+                    compensation = 0.0
+
+        if observations == window and window > ddof:
+            out[i] = np.sqrt(max(squares, 0.0) / (window - ddof))
+
+    return out
+
+@numba.njit(cache=True)
+def rolling_extreme(values: np.ndarray, window: int, maximum: bool) -> np.ndarray:
+    """
+    Rolling maximum or minimum of the last `window` bars, including the
+    current bar, using a monotonic deque for O(1) amortised work per bar.
+    The first bars use however many bars are available, and NaN values
+    are skipped.
+    """
+    bars = values.size
+    out = np.full(bars, np.nan)
+    # Deque of bar indexes whose values are monotonic, stored in a ring buffer
+    deque = np.empty(window, dtype=np.int64)
+    head = 0
+    size = 0
+
+    for i in range(bars):
+        # Drop the front once it leaves the window
+        if size > 0 and deque[head] <= i - window:
+            head = (head + 1) % window
+            size -= 1
+
+        current = values[i]
+        if current == current:
+            # Drop values from the back which can no longer be the extreme
+            while size > 0:
+                back = values[deque[(head + size - 1) % window]]
+                if (back <= current) if maximum else (back >= current):
+                    size -= 1
+                else:
+                    break
+            deque[(head + size) % window] = i
+            size += 1
+
+        if size > 0:
+            out[i] = values[deque[head]]
+
+    return out
+
+@numba.njit(cache=True)
+def segmented_maximum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Running maximum which restarts at every bar where starts is True, e.g.
+    the highest close since each entry. NaN values are skipped, and bars
+    before the first start are NaN.
+    """
+    bars = values.size
+    out = np.full(bars, np.nan)
+    running = np.nan
+    started = False
+
+    for i in range(bars):
+        if starts[i]:
+            running = np.nan
+            started = True
+        if not started:
+            continue
+        current = values[i]
+        if current == current and not (running >= current):
+            running = current
+        out[i] = running
+
+    return out
+
+@numba.njit(cache=True)
+def stop_exits(close: np.ndarray,
+               entries: np.ndarray,
+               sources: np.ndarray,
+               scales: np.ndarray,
+               offsets: np.ndarray,
+               trailing: np.ndarray,
+               targets: np.ndarray,
+               inclusive: np.ndarray) -> tuple:
+    """
+    Trades exited by stop rules, following one trade at a time so that
+    entries while holding are ignored. Rule r's path is scales[r] * (the
+    highest sources[r] since the entry, or sources[r] on the entry bar if
+    not trailing[r]) + offsets[r]. Exits are checked from the entry bar.
+
+    Returns:
+    tuple: Arrays of the entry and exit bar indexes of the trades taken.
+           The exit is the number of bars for a trade still held.
+    """
+    bars = close.size
+    rules = scales.size
+    taken = np.empty(entries.size, dtype=np.int64)
+    exits = np.empty(entries.size, dtype=np.int64)
+    levels = np.empty(rules)
+    count = 0
+    k = 0
+
+    while k < entries.size:
+        entry = entries[k]
+        levels[:] = np.nan
+        exit = bars
+
+        for i in range(entry, bars):
+            broken = False
+            for r in range(rules):
+                current = sources[r, i]
+                if (trailing[r] or i == entry) and current == current and not (levels[r] >= current):
+                    levels[r] = current
+                path = levels[r] * scales[r] + offsets[r, i]
+                if targets[r]:
+                    if close[i] > path or (inclusive[r] and close[i] == path):
+                        broken = True
+                elif close[i] < path or (inclusive[r] and close[i] == path):
+                    broken = True
+            if broken:
+                exit = i
+                break
+
+        taken[count] = entry
+        exits[count] = exit
+        count += 1
+
+        # Skip the entries while holding
+        while k < entries.size and entries[k] <= exit:
+            k += 1
+
+    return taken[:count], exits[:count]
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    return rolling_extreme(np.asarray(values, dtype=np.float64), window, True)
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    return rolling_extreme(np.asarray(values, dtype=np.float64), window, False)
+
+@numba.njit(cache=True)
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """
+    True range of each bar. The first bar has no previous close so its
+    true range is its high - low.
+    """
+    bars = close.size
+    out = np.empty(bars, dtype=np.float64)
+    if bars == 0:
+        return out
+
+    out[0] = high[0] - low[0]
+    for i in range(1, bars):
+        prev_close = close[i - 1]
+        out[i] = max(high[i] - low[i],
+                     abs(high[i] - prev_close),
+                     abs(low[i] - prev_close))
+    return out
+
+@numba.njit(cache=True)
+def wilder_atr(tr: np.ndarray, period: int, seed: float = np.nan) -> np.ndarray:
+    """
+    Average true range using Wilder's smoothing. The first value is the
+    mean of the first `period` true ranges, and each value after that is
+    (previous * (period - 1) + tr) / period. Missing true ranges carry the
+    previous value forward.
+
+    The recurrence depends on the previous value, so it must run
+    sequentially.
+
+    Parameters:
+    tr (np.ndarray): True range of each bar.
+    period (int): The smoothing period.
+    seed (float): The ATR of the bar before tr[0], to continue an existing
+                  series. NaN to start a new one.
+
+    Returns:
+    np.ndarray: ATR of each bar, NaN until `period` true ranges are seen.
+    """
+    bars = tr.size
+    out = np.full(bars, np.nan)
+    atr = seed
+    total = 0.0
+    observations = 0
+
+    for i in range(bars):
+        if atr == atr:
+            if tr[i] == tr[i]:
+                atr = (atr * (period - 1) + tr[i]) / period
+            out[i] = atr
+        elif tr[i] == tr[i]:
+            total += tr[i]
+            observations += 1
+            if observations == period:
+                atr = total / period
+                out[i] = atr
+
+    return out
+
+@numba.njit(cache=True)
+def pair_trades(entries: np.ndarray, exits: np.ndarray, close: np.ndarray) -> tuple:
+    """
+    Pair sorted entry and exit bar indexes into trades. An entry while
+    holding and an exit while not holding are ignored, and an entry and
+    exit on the same bar are taken in that order.
+
+    Parameters:
+    entries (np.ndarray): Sorted entry bar indexes.
+    exits (np.ndarray): Sorted exit bar indexes.
+    close (np.ndarray): Close prices, trades execute at the close.
+
+    Returns:
+    tuple: (entry bars, exit bars, outcomes, value, wins, losses, neutral),
+           where each outcome is exit price / entry price and value is
+           the compounded outcome of every trade.
+    """
+    count = min(entries.size, exits.size)
+    trade_entries = np.empty(count, dtype=np.int64)
+    trade_exits = np.empty(count, dtype=np.int64)
+    outcomes = np.empty(count, dtype=np.float64)
+    trades = 0
+
+    value = 1.0
+    wins = 0
+    losses = 0
+    neutral = 0
+    hold_value = 0.0
+    hold_bar = -1
+
+    i = 0
+    j = 0
+    while i < entries.size or j < exits.size:
+        # Entry signal, taken before an exit on the same bar
+        if j == exits.size or (i < entries.size and entries[i] <= exits[j]):
+            if hold_value == 0:
+                hold_value = close[entries[i]]
+                hold_bar = entries[i]
+            i += 1
+            continue
+
+        # Exit signal
+        if hold_value != 0:
+            outcome = close[exits[j]] / hold_value
+
+            losses  += outcome < 1
+            wins    += outcome > 1
+            neutral += outcome == 1
+
+            value *= outcome
+            trade_entries[trades] = hold_bar
+            trade_exits[trades] = exits[j]
+            outcomes[trades] = outcome
+            trades += 1
+            hold_value = 0.0
+        j += 1
+
+    return (trade_entries[:trades], trade_exits[:trades], outcomes[:trades],
+            value, wins, losses, neutral)
+
+@numba.njit(cache=True)
+def portfolio(close: np.ndarray,
+              entries: np.ndarray,
+              exits: np.ndarray,
+              max_positions: int,
+              capital: float = 1.0) -> tuple:
+    """
+    Simulate one pool of capital trading a (tickers, bars) panel, holding
+    at most max_positions stocks at once. Each bar, exits are taken first
+    to free capital, then entries are taken in ticker order while there
+    are free positions. Each new position is given an equal share of the
+    cash over the free positions. An entry and exit on the same bar is
+    skipped, as it would be a neutral trade.
+
+    Parameters:
+    close (np.ndarray): Close prices of shape (tickers, bars), NaN where a
+                        ticker has no bar. Held stocks are valued at their
+                        last close.
+    entries (np.ndarray): Boolean entry signals of shape (tickers, bars).
+    exits (np.ndarray): Boolean exit signals of shape (tickers, bars).
+    max_positions (int): The most stocks held at once.
+    capital (float): The starting cash.
+
+    Returns:
+    tuple: (equity, cash, positions, trade tickers, trade entry bars,
+           trade exit bars, outcomes). equity, cash and positions hold the
+           value of each bar, and each outcome is exit price / entry price.
+    """
+    tickers, bars = close.shape
+    equity = np.empty(bars, dtype=np.float64)
+    cash_curve = np.empty(bars, dtype=np.float64)
+    positions = np.empty(bars, dtype=np.int64)
+
+    trade_limit = 0
+    for k in range(tickers):
+        for t in range(bars):
+            trade_limit += entries[k, t]
+    trade_tickers = np.empty(trade_limit, dtype=np.int64)
+    trade_entries = np.empty(trade_limit, dtype=np.int64)
+    trade_exits = np.empty(trade_limit, dtype=np.int64)
+    outcomes = np.empty(trade_limit, dtype=np.float64)
+    trades = 0
+
+    held = np.zeros(tickers, dtype=np.bool_)
+    shares = np.zeros(tickers, dtype=np.float64)
+    entry_price = np.zeros(tickers, dtype=np.float64)
+    entry_bar = np.zeros(tickers, dtype=np.int64)
+    last_price = np.full(tickers, np.nan)
+    cash = capital
+    count = 0
+
+    for t in range(bars):
+        # Take exits, freeing their capital
+        for k in range(tickers):
+            price = close[k, t]
+            if price == price:
+                last_price[k] = price
+            if held[k] and exits[k, t]:
+                cash += shares[k] * price
+                trade_tickers[trades] = k
+                trade_entries[trades] = entry_bar[k]
+                trade_exits[trades] = t
+                outcomes[trades] = price / entry_price[k]
+                trades += 1
+                held[k] = False
+                count -= 1
+
+        # Take entries while there are free positions
+        for k in range(tickers):
+            if count >= max_positions:
+                break
+            if entries[k, t] and not exits[k, t] and not held[k]:
+                allocation = cash / (max_positions - count)
+                shares[k] = allocation / close[k, t]
+                entry_price[k] = close[k, t]
+                entry_bar[k] = t
+                held[k] = True
+                cash -= allocation
+                count += 1
+
+        # Value the holdings
+        value = cash
+        for k in range(tickers):
+            if held[k]:
+                value += shares[k] * last_price[k]
+        equity[t] = value
+        cash_curve[t] = cash
+        positions[t] = count
+
+    return (equity, cash_curve, positions, trade_tickers[:trades],
+            trade_entries[:trades], trade_exits[:trades], outcomes[:trades])
+
+@numba.njit(cache=True, parallel=True)
+def resampled_statistics(returns: np.ndarray, order: np.ndarray) -> tuple:
+    """
+    Statistics of many resampled sequences of the same trades, computed in
+    parallel over the samples.
+
+    Parameters:
+    returns (np.ndarray): Return of each trade, exit price / entry price - 1.
+    order (np.ndarray): Array of shape (samples, trades) of indexes into
+                        returns, the trades of each sample in order.
+
+    Returns:
+    tuple: (value, drawdown, losing streak) arrays with one entry per
+           sample. value is the compounded outcome, drawdown the largest
+           fall from a peak of the trade by trade equity as a fraction of
+           the peak, and losing streak the most losing trades in a row.
+    """
+    samples, trades = order.shape
+    value = np.empty(samples, dtype=np.float64)
+    drawdown = np.empty(samples, dtype=np.float64)
+    losing_streak = np.empty(samples, dtype=np.int64)
+
+    for s in numba.prange(samples):
+        equity = 1.0
+        peak = 1.0
+        worst = 0.0
+        streak = 0
+        longest = 0
+        for t in range(trades):
+            outcome = returns[order[s, t]]
+            equity *= 1.0 + outcome
+            if equity > peak:
+                peak = equity
+            worst = max(worst, 1.0 - equity / peak)
+            if outcome < 0:
+                streak += 1
+                longest = max(longest, streak)
+            else:
+                streak = 0
+        value[s] = equity
+        drawdown[s] = worst
+        losing_streak[s] = longest
+
+    return value, drawdown, losing_streak
+
+# Actions returned by a strategy rule, see strategy_driver()
+HOLD  = 0
+ENTER = 1
+EXIT  = -1
+
+# Slots of the position array passed to a strategy rule
+HOLDING        = 0      # 1 while holding, otherwise 0
+ENTRY_BAR      = 1
+ENTRY_PRICE    = 2
+PEAK           = 3      # Highest close since the entry
+STOP           = 4      # Exit once the close falls below this
+POSITION_SLOTS = 5
+
+# Compiled drivers keyed by the rule they call
+DRIVERS = {}
+
+def strategy_driver(rule):
+    """
+    Generate the compiled bar loop for a strategy rule.
+
+    The rule is a numba.njit function called as
+    rule(i, inputs, parameters, state, position) -> action on every bar,
+    where inputs is a tuple of the input arrays, parameters and state are
+    float64 arrays and position holds the HOLDING, ENTRY_BAR, ENTRY_PRICE,
+    PEAK and STOP slots. It returns ENTER, EXIT or HOLD, and may update
+    its state and the stop.
+
+    The driver keeps the position and records signals. When the rule
+    enters, it is called again on the same bar while holding, so it can
+    set the stop or exit at once. A holding position exits when the rule
+    returns EXIT or the close falls below the stop.
+
+    Returns:
+    Callable: driver(close, inputs, parameters, state) -> (entries, exits)
+              as arrays of bar indexes.
+    """
+    if rule in DRIVERS:
+        return DRIVERS[rule]
+
+    # Generated per rule, so it cannot use numba's on-disk cache
+    @numba.njit
+    def driver(close, inputs, parameters, state):
+        bars = close.size
+        entries = np.empty(bars, dtype=np.int64)
+        exits = np.empty(bars, dtype=np.int64)
+        entry_count = 0
+        exit_count = 0
+        position = np.zeros(POSITION_SLOTS, dtype=np.float64)
+
+        for i in range(bars):
+            if position[HOLDING] != 0 and close[i] > position[PEAK]:
+                position[PEAK] = close[i]
+
+            action = rule(i, inputs, parameters, state, position)
+
+            # Enter, then let the rule manage the new position on this bar
+            if position[HOLDING] == 0:
+                if action != ENTER:
+                    continue
+                entries[entry_count] = i
+                entry_count += 1
+                position[HOLDING] = 1
+                position[ENTRY_BAR] = i
+                position[ENTRY_PRICE] = close[i]
+                position[PEAK] = close[i]
+                position[STOP] = 0.0
+                action = rule(i, inputs, parameters, state, position)
+
+            # Exit on the rule or the stop
+            if action == EXIT or close[i] < position[STOP]:
+                exits[exit_count] = i
+                exit_count += 1
+                position[HOLDING] = 0
+                position[ENTRY_PRICE] = 0.0
+                position[PEAK] = 0.0
+                position[STOP] = 0.0
+
+        return entries[:entry_count], exits[:exit_count]
+
+    DRIVERS[rule] = driver
+    return driver
+
+# Functions which compile kernels defined outside this module
+WARMUPS = []
+
+def read_only(values) -> np.ndarray:
+    """
+    A contiguous, read-only view, the array type StockData holds its
+    columns as. Kernels are compiled for this type by precompile().
+    """
+    values = np.ascontiguousarray(values)
+    if values.flags.writeable:
+        values = values.view()
+        values.flags.writeable = False
+    return values
+
+def warmup(function):
+    """
+    Decorator registering a function which calls kernels on small inputs,
+    so precompile() also compiles them. Returns the function unchanged.
+    """
+    WARMUPS.append(function)
+    return function
+
+def precompile():
+    """
+    Compile (or load from numba's on-disk cache) every kernel for float64
+    arrays, so the first backtest in a new process does not pay for it.
+
+    numba compiles a kernel again for each new argument type, including
+    read-only arrays and omitted defaults, so every kernel is called as it
+    is in real use. StockData columns are read-only, while kernel outputs
+    and bar indexes are writable.
+    """
+    values = np.linspace(1.0, 2.0, 8)
+    column = read_only(values)
+    entries = np.array([0, 4])
+    exits = np.array([2, 6])
+
+    ema_bank(column, np.array([2, 3], dtype=np.int64))
+    ema(column, 2)
+    rolling_mean(column, 2)
+    rolling_std(column, 2)
+    rolling_extreme(column, 2, True)
+    tr = read_only(true_range(column, column, column))
+    wilder_atr(tr, 2)
+    wilder_atr(tr, 2, 1.0)
+    pair_trades(entries, exits, column)
+
+    # Stop paths come from columns, or are computed from them
+    segmented_maximum(column, values > 1.5)
+    segmented_maximum(values, values > 1.5)
+    flags = np.zeros(1, dtype=np.bool_)
+    stop_exits(column, entries, values.reshape(1, -1), np.ones(1),
+               np.zeros((1, values.size)), flags, flags, flags)
+
+    signals = np.zeros((2, values.size), dtype=np.bool_)
+    portfolio(np.vstack((values, values)), signals, signals, 1, 1.0)
+    resampled_statistics(values - 1.5, np.zeros((2, 3), dtype=np.int64))
+
+    for function in WARMUPS:
+        function()
@@ -1,9 +1,10 @@
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import datetime
+import itertools
 import nitolos as nit
+import streaming
 
 from strategies import solo
 from strategies import solo_mini
@@ -71,11 +72,17 @@ def new_world_main():
     stock_codes = ["CBA", "NAB", "WAM", "TLC", "DRO", "PLS", "BHP", "NHC", "WAF"]
     results = []
 
-    for stock_code in stock_codes:
+    # Load all stocks concurrently
+    universe = nit.StockUniverse(stock_codes, datetime.datetime(2016, 1, 1))
+    universe.load()
+
+    # Results of earlier runs on the same bars are reused
+    store = nit.ResultStore()
+
+    for stock_code, stock_data in universe.items():
         stock_results = []
         results.append(stock_results)
         print()
-        stock_data = nit.StockData(stock_code, datetime.datetime(2016, 1, 1))
 
         # Create the strategy
         minis = [
@@ -83,7 +90,7 @@ def new_world_main():
         ]
         mini_names = ["10/20"]
         for k, mini in enumerate(minis):
-            entries, exits = mini.backtest(stock_data, False)
+            entries, exits = mini.backtest(stock_data, False, store=store)
 
             # Execute the signals on the stock data
             value, wins, losses, neutral = nit.execute_signals(entries, exits, stock_data)
@@ -118,11 +125,42 @@ def new_world_main():
 
                 plt.show()
 
+    # Best stored parameters of each stock
+    print(store.best(strategy='strategies.solo_mini.SoloMini'))
+
+    # Run the strategy over the whole universe as one portfolio
+    curve, trades = universe.backtest(solo_mini.SoloMini(10, 20), max_positions=3)
+    print(f"\nPortfolio Final Value: {curve['equity'].iloc[-1]:.5f} from {len(trades)} trades")
+    if show_charts:
+        fig = plt.figure()
+        ax = fig.add_subplot()
+        ax.plot(curve.index, curve['equity'], 'k-', label='Portfolio')
+        ax.margins(x=0, y=0)
+        ax.grid(True)
+        ax.legend()
+        plt.title("Mini Solo Portfolio")
+
     # fig, ax = plot_nested_comparisons(results, group_names=stock_codes)
     plt.show()
     return
 
 
+def paper_trade_main():
+    stock_code = "CBA"
+    mini = solo_mini.SoloMini(10, 20)
+
+    # Replay the cached history to build up the strategy state, then follow new bars
+    stock_data = nit.StockData(stock_code, datetime.datetime(2016, 1, 1))
+    bars = itertools.chain(streaming.replay(stock_data),
+                           streaming.live_bars(stock_data.source,
+                                               stock_code,
+                                               stock_data.end_date + datetime.timedelta(days=1),
+                                               poll_seconds=15 * 60))
+
+    for date, signal, bar in streaming.stream(mini, bars):
+        print(f"{date.strftime('%Y-%m-%d')} {stock_code} {signal} at {bar['Close']:.3f}")
+
+
 def atr_test():
     pls = nit.StockData('PLS', datetime.datetime(2018, 1, 1))
 
@@ -172,79 +210,43 @@ def main():
     # return
 
     # Create and run a strategy
-    solotin100 = nit.Strategy(solo.buy,
-                            solo.sell,
+    solotin100 = nit.Strategy(solo.buy_indices,
+                            solo.sell_indices,
+                            ('ema50', 'ema100', 'Close'),
                             ('ema50', 'ema100', 'Close'),
-                            ('ema50', 'ema100', 'Close'))
-    solotin150 = nit.Strategy(solo.buy,
-                            solo.sell,
+                            indices=True)
+    solotin150 = nit.Strategy(solo.buy_indices,
+                            solo.sell_indices,
                             ('ema50', 'ema150', 'Close'),
-                            ('ema50', 'ema150', 'Close'))
-    solotin200 = nit.Strategy(solo.buy,
-                            solo.sell,
+                            ('ema50', 'ema150', 'Close'),
+                            indices=True)
+    solotin200 = nit.Strategy(solo.buy_indices,
+                            solo.sell_indices,
+                            ('ema50', 'ema200', 'Close'),
                             ('ema50', 'ema200', 'Close'),
-                            ('ema50', 'ema200', 'Close'))
+                            indices=True)
 
-    test_strat1 = nit.Strategy(test1.buy,
-                            test1.sell,
+    test_strat1 = nit.Strategy(test1.buy_indices,
+                            test1.sell_indices,
                             ('d_ema200', 'Close'),
-                            ('d_ema200', 'Close'))
+                            ('d_ema200', 'Close'),
+                            indices=True)
 
     # buys, sells = test_strat1.run(pls)
-    solotins = []
-    value_array = []
-    solo_buys = []
-    solo_sells = []
-    lema = ''
-    indent = -1
-
-    for i in range(20, 301, 10):
-        value_array.insert(0, [])
-        large_ema = 'ema' + str(i)
-        for j in range(10, 151, 10):
-            small_ema = 'ema' + str(j)
-            if (j >= i):
-                value_array[0].append(np.nan)
-                continue
-
-            # Run strategy
-            strategy = nit.Strategy(solo.buy,
-                                    solo.sell,
-                                    (small_ema, large_ema, 'Close'),
-                                    (small_ema, large_ema, 'Close'))
-            b, s, v = strategy.run_and_evaluate(pls)
-            solotins.append((
-                strategy,
-                small_ema,
-                large_ema
-            ))
-
-            # Store results
-            solo_buys.append(b)
-            solo_sells.append(s)
-            value_array[0].append(v)
-
-            # Display
-            if lema != large_ema:
-                lema = large_ema
-                indent += 1
-            if int(large_ema[3:]) % 20 == 0:
-                indent = 0
-            indents = '\t' * indent
-            # print(f"{indents}Large EMA {large_ema[3:]}, Small EMA {small_ema[3:]}, Value {v}")
-
-
+    # Evaluate every small/large ema pair in one pass, largest ema on the top row
+    small_periods = range(10, 151, 10)
+    large_periods = range(20, 301, 10)
+    values = solo.sweep(pls, small_periods, large_periods, store=nit.ResultStore())[::-1]
 
     # Display heatmap
-    values = np.array(value_array)
     values[values < 1] = 0
     print(f"Min: {np.nanmin(values)}, Max: {np.nanmax(values)}")
     
     fig = plt.figure()
     ax = fig.add_subplot()
     im = ax.imshow(values)
-    ax.set_xticks(np.arange(len(value_array[0])), np.arange(10, 151, 10))
-    ax.set_yticks(np.arange(len(value_array)), np.arange(300, 19, -10))
+    ax.set_xticks(np.arange(len(small_periods)), small_periods)
+    ax.set_yticks(np.arange(len(large_periods)), large_periods[::-1])
     ax.set_xlabel("Small EMA")
     ax.set_ylabel("Large EMA")
     ax.set_title(f"Heatmap of {stock}")
@@ -277,19 +279,10 @@ def main():
     #         'c-',
     #         label='ema100')
 
-    # Plot buy and sell dates
+    # Plot buy and sell signals
     def plot_bs(ax, buys, sells, b_fmt = 'bo', s_fmt = 'ro'):
-        for i in buys:
-            ax.plot(pd.Timestamp(i),
-                    pls.data['Close'][i],
-                    b_fmt,
-                    markersize=8)
-
-        for i in sells:
-            ax.plot(pd.Timestamp(i),
-                    pls.data['Close'][i],
-                    s_fmt,
-                    markersize=16)
+        pls.plot_signals(buys, [], fig, ax, b_fmt, s_fmt, markersize=8)
+        pls.plot_signals([], sells, fig, ax, b_fmt, s_fmt, markersize=16)
 
     plot_bs(ax, bs100, ss100, 'bo', 'ro')
     plot_bs(ax, bs150, ss150, 'co', 'mo')
@@ -301,4 +294,5 @@ def main():
     plt.show()
 
 if __name__ == '__main__':
+    nit.precompile()
     new_world_main()
@@ -1,24 +1,546 @@
 from typing import Callable, Iterable
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
 import os
+import multiprocessing
+import pickle
+import tempfile
+import itertools
 import datetime
 import json
+import hashlib
+import sqlite3
 import yfinance as yf
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import numba
+import indicators as ind
+import kernels
+import robustness
+import stops
+
+class CsvCache:
+    """
+    Plain text cache. Slow to load since every date and float is parsed,
+    kept so older ./cache/*.csv files can still be read and migrated.
+    """
+    # Exchange timezone of the bars. Dates are written with their UTC offset
+    # which changes with daylight savings, so they are parsed as UTC and
+    # converted back rather than left on the previous day in UTC.
+    TIMEZONE = 'Australia/Sydney'
+
+    @staticmethod
+    def parse_index(index: pd.Index) -> pd.Index:
+        # Dates written without an offset are left naive
+        if isinstance(index, pd.DatetimeIndex) and index.tz is None:
+            return index
+        return pd.to_datetime(index, utc=True).tz_convert(CsvCache.TIMEZONE)
+
+    @staticmethod
+    def load(path: str) -> pd.DataFrame:
+        data = pd.read_csv(path, index_col=0, parse_dates=True)
+        data.index = CsvCache.parse_index(data.index)
+        return data
+
+    @staticmethod
+    def save(path: str, data: pd.DataFrame):
+        data.to_csv(path)
+
+    @staticmethod
+    def append(path: str, data: pd.DataFrame):
+        data.to_csv(path, mode='a', header=False)
+
+class SegmentedCache:
+    """
+    Base for binary caches which cannot be appended to in place.
+    Appended rows are written to numbered segment files beside the main
+    file (CBA.npz, CBA.1.npz, CBA.2.npz, ...) and merged when loading.
+    Saving the full data compacts the segments back into the main file.
+    """
+    MAX_SEGMENTS = 32
+
+    @classmethod
+    def read(cls, path: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+    @classmethod
+    def write(cls, path: str, data: pd.DataFrame):
+        raise NotImplementedError
+
+    @staticmethod
+    def segment_paths(path: str) -> list:
+        root, ext = os.path.splitext(path)
+        paths = []
+        while os.path.exists(f"{root}.{len(paths) + 1}{ext}"):
+            paths.append(f"{root}.{len(paths) + 1}{ext}")
+        return paths
+
+    @classmethod
+    def load(cls, path: str) -> pd.DataFrame:
+        segment_paths = cls.segment_paths(path)
+        data = cls.read(path)
+        if len(segment_paths) == 0:
+            return data
+
+        # Segments written from another source may be in another timezone
+        data = pd.concat([data] + [conform(cls.read(p), data.index)
+                                   for p in segment_paths])
+        # Rows may be repeated if a compaction was interrupted
+        return data[~data.index.duplicated(keep='last')]
+
+    @classmethod
+    def save(cls, path: str, data: pd.DataFrame):
+        segment_paths = cls.segment_paths(path)
+        cls.write(path, data)
+        for segment_path in reversed(segment_paths):
+            os.remove(segment_path)
+
+    @classmethod
+    def append(cls, path: str, data: pd.DataFrame):
+        segment_paths = cls.segment_paths(path)
+
+        # Compact once there are too many segments to load quickly
+        if len(segment_paths) >= cls.MAX_SEGMENTS:
+            cached = cls.load(path)
+            cls.save(path, pd.concat((cached, conform(data, cached.index))))
+            return
+
+        root, ext = os.path.splitext(path)
+        cls.write(f"{root}.{len(segment_paths) + 1}{ext}", data)
+
+class NpzCache(SegmentedCache):
+    """
+    Binary NumPy cache. Each column is stored as its own array so loading
+    is a straight memory copy and dtypes are preserved exactly.
+    """
+    INDEX_KEY = '__index__'
+    META_KEY = '__meta__'
+
+    @classmethod
+    def read(cls, path: str) -> pd.DataFrame:
+        with np.load(path, allow_pickle=False) as arrays:
+            meta = json.loads(str(arrays[cls.META_KEY]))
+            index = pd.DatetimeIndex(arrays[cls.INDEX_KEY],
+                                     name=meta['index-name'])
+            if meta['tz']:
+                index = index.tz_localize('UTC').tz_convert(meta['tz'])
+
+            return pd.DataFrame({col: arrays[col] for col in meta['columns']},
+                                index=index)
+
+    @classmethod
+    def write(cls, path: str, data: pd.DataFrame):
+        index = data.index
+        # An empty download (e.g. an unknown ticker) has no dates
+        if not isinstance(index, pd.DatetimeIndex):
+            index = pd.DatetimeIndex(index, name=index.name)
+        tz = ''
+        # Store timestamps as naive UTC alongside the timezone name
+        if index.tz is not None:
+            tz = str(index.tz)
+            index = index.tz_convert('UTC').tz_localize(None)
+
+        meta = {
+            'columns': [str(col) for col in data.columns],
+            'tz': tz,
+            'index-name': index.name
+        }
+        arrays = {str(col): data[col].to_numpy() for col in data.columns}
+        arrays[cls.INDEX_KEY] = index.to_numpy()
+        arrays[cls.META_KEY] = np.array(json.dumps(meta))
+        with open(path, 'wb') as cache_file:
+            np.savez(cache_file, **arrays)
+
+class ParquetCache(SegmentedCache):
+    """
+    Columnar Parquet cache. Requires pyarrow (or fastparquet).
+    """
+    @classmethod
+    def read(cls, path: str) -> pd.DataFrame:
+        return pd.read_parquet(path)
+
+    @classmethod
+    def write(cls, path: str, data: pd.DataFrame):
+        data.to_parquet(path)
+
+class FeatherCache(SegmentedCache):
+    """
+    Columnar Feather (Arrow IPC) cache. Requires pyarrow.
+    """
+    @classmethod
+    def read(cls, path: str) -> pd.DataFrame:
+        data = pd.read_feather(path)
+        return data.set_index(data.columns[0])
+
+    @classmethod
+    def write(cls, path: str, data: pd.DataFrame):
+        # Feather cannot store a non-default index
+        data.reset_index().to_feather(path)
+
+# Cache backends keyed by file extension
+CACHE_BACKENDS = {
+    '.csv': CsvCache,
+    '.npz': NpzCache,
+    '.parquet': ParquetCache,
+    '.feather': FeatherCache
+}
+
+class IndicatorStore:
+    """
+    On-disk store of derived indicator columns for one ticker. Each column
+    is saved with the number of bars it was computed over and a
+    fingerprint of those bars, so a stored column is ignored once the
+    underlying data changes, and can be extended rather than recomputed
+    when new bars are appended.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, indicator: str) -> str:
+        return os.path.join(self.directory, indicator + '.npz')
+
+    def load(self, indicator: str) -> tuple:
+        """
+        Returns:
+        tuple: (values, fingerprint, version) or None if the indicator is not stored.
+        """
+        path = self.path(indicator)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as stored:
+            version = int(stored['version']) if 'version' in stored else 1
+            return stored['values'], str(stored['fingerprint']), version
+
+    def save(self,
+             indicator: str,
+             values: np.ndarray,
+             fingerprint: str,
+             version: int = 1):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(indicator), 'wb') as store_file:
+            np.savez(store_file,
+                     values=values,
+                     fingerprint=np.array(fingerprint),
+                     version=np.array(version))
+
+class ResultStore:
+    """
+    SQLite store of backtest results. Each result is keyed by the strategy,
+    its parameters, the ticker and a fingerprint of the bars it was run on,
+    so results can be reused instead of recomputed until the data changes,
+    and compared or plotted later without re-running anything.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            strategy    TEXT NOT NULL,
+            parameters  TEXT NOT NULL,
+            ticker      TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            value       REAL,
+            wins        INTEGER,
+            losses      INTEGER,
+            neutral     INTEGER,
+            trades      INTEGER,
+            metrics     TEXT,
+            entries     BLOB,
+            exits       BLOB,
+            created     TEXT,
+            PRIMARY KEY (strategy, parameters, ticker, fingerprint)
+        );
+        CREATE INDEX IF NOT EXISTS results_by_ticker
+            ON results (ticker, strategy, value DESC);
+    """
+    COLUMNS = ('strategy', 'parameters', 'ticker', 'fingerprint', 'value',
+               'wins', 'losses', 'neutral', 'trades', 'metrics', 'created')
+
+    def __init__(self, path: str = None):
+        """
+        Parameters:
+        path (str): The database file, defaulting to results.sqlite in the cache.
+        """
+        if path is None:
+            path = StockData.CACHE_DIR + 'results.sqlite'
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(ResultStore.SCHEMA)
+
+    @staticmethod
+    def key(strategy, stock: 'StockData') -> tuple:
+        """
+        Parameters:
+        strategy: The strategy, or its (name, parameters) for results which
+                  do not come from a strategy object, e.g. solo.sweep.
+        stock (StockData): The bars the strategy was run on.
+
+        Returns:
+        tuple: (strategy, parameters, ticker, fingerprint) identifying a run.
+        """
+        if isinstance(strategy, tuple):
+            name, parameters = strategy
+        else:
+            name, parameters = strategy_identity(strategy)
+        return (name,
+                json.dumps(parameters, sort_keys=True, default=ResultStore.json_value),
+                stock.ticker,
+                stock.fingerprint(len(stock)))
+
+    @staticmethod
+    def json_value(value):
+        # NumPy scalars, e.g. from np.arange grids, key the same as Python
+        # numbers, anything else by its string
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return str(value)
+
+    def get(self, key: tuple) -> dict:
+        """
+        Returns:
+        dict: The stored result, with its entries and exits as arrays of bar
+              indexes (None if they were not stored), or None if there is none.
+        """
+        row = self.connection.execute(
+            "SELECT value, wins, losses, neutral, trades, metrics, entries, exits"
+            " FROM results"
+            " WHERE strategy = ? AND parameters = ? AND ticker = ? AND fingerprint = ?",
+            key).fetchone()
+        if row is None:
+            return None
+
+        value, wins, losses, neutral, trades, metrics, entries, exits = row
+        return {
+            'value': value,
+            'wins': wins,
+            'losses': losses,
+            'neutral': neutral,
+            'trades': trades,
+            **json.loads(metrics),
+            'entries': None if entries is None else np.frombuffer(entries, dtype=np.int64),
+            'exits': None if exits is None else np.frombuffer(exits, dtype=np.int64)
+        }
+
+    def put(self,
+            key: tuple,
+            value: float,
+            wins: int,
+            losses: int,
+            neutral: int,
+            trades: int,
+            entries: np.ndarray = None,
+            exits: np.ndarray = None,
+            **metrics):
+        """
+        Store a result, replacing any result with the same key.
+
+        Parameters:
+        key (tuple): From ResultStore.key().
+        entries (np.ndarray): Entry bar indexes, to rebuild the trades.
+        exits (np.ndarray): Exit bar indexes.
+        **metrics: Any other statistics, e.g. from robustness.summary().
+        """
+        self.put_many([(key, value, wins, losses, neutral, trades, entries, exits, metrics)])
+
+    def put_many(self, results: Iterable):
+        # Results as tuples of put()'s arguments, with metrics as a dict
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        rows = []
+        for key, value, wins, losses, neutral, trades, entries, exits, metrics in results:
+            rows.append((*key,
+                         float(value), int(wins), int(losses), int(neutral), int(trades),
+                         json.dumps(metrics, default=float),
+                         None if entries is None else np.asarray(entries, dtype=np.int64).tobytes(),
+                         None if exits is None else np.asarray(exits, dtype=np.int64).tobytes(),
+                         now))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+
+    def query(self, ticker: str = None, strategy: str = None) -> pd.DataFrame:
+        """
+        Every stored result, optionally of one ticker or strategy, with the
+        parameters and metrics expanded into columns.
+        """
+        conditions = []
+        arguments = []
+        if ticker is not None:
+            conditions.append("ticker = ?")
+            arguments.append(ticker)
+        if strategy is not None:
+            conditions.append("strategy = ?")
+            arguments.append(strategy)
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+        rows = self.connection.execute(
+            f"SELECT {', '.join(ResultStore.COLUMNS)} FROM results{where}"
+            " ORDER BY ticker, strategy, value DESC",
+            arguments).fetchall()
+        return ResultStore.frame(rows)
+
+    def best(self, strategy: str = None, by: str = 'value') -> pd.DataFrame:
+        """
+        The best result of each ticker (and strategy), using the index on
+        (ticker, strategy, value).
+
+        Parameters:
+        strategy (str): Only consider this strategy.
+        by (str): 'value', 'wins' or 'trades', the column to maximise.
+        """
+        if by not in ('value', 'wins', 'trades'):
+            raise ValueError(f"Cannot rank results by: {by}")
+        where = " WHERE strategy = ?" if strategy is not None else ""
+        rows = self.connection.execute(
+            f"SELECT {', '.join(ResultStore.COLUMNS)} FROM ("
+            f"  SELECT *, ROW_NUMBER() OVER (PARTITION BY ticker, strategy"
+            f"                               ORDER BY {by} DESC) AS rank"
+            f"  FROM results{where})"
+            " WHERE rank = 1 ORDER BY ticker, strategy",
+            [] if strategy is None else [strategy]).fetchall()
+        return ResultStore.frame(rows)
+
+    def clear(self, strategy: str = None):
+        # Forget results, e.g. after changing a strategy's logic
+        with self.connection:
+            if strategy is None:
+                self.connection.execute("DELETE FROM results")
+            else:
+                self.connection.execute("DELETE FROM results WHERE strategy = ?", (strategy, ))
+
+    @staticmethod
+    def frame(rows: list) -> pd.DataFrame:
+        records = []
+        for row in rows:
+            record = dict(zip(ResultStore.COLUMNS, row))
+            parameters = json.loads(record.pop('parameters'))
+            metrics = json.loads(record.pop('metrics'))
+            if isinstance(parameters, dict):
+                record.update(parameters)
+            record.update(metrics)
+            records.append(record)
+        return pd.DataFrame(records)
+
+def precompile():
+    """
+    Compile every kernel ahead of time. Call at startup so the first
+    backtest in a new process does not pay the JIT compile time.
+    """
+    kernels.precompile()
+
+def localise(date: datetime.datetime, index: pd.DatetimeIndex) -> pd.Timestamp:
+    # Compare naive dates against a timezone aware index in its own timezone
+    date = pd.Timestamp(date)
+    if index.tz is not None and date.tz is None:
+        return date.tz_localize(index.tz)
+    return date
+
+def conform(data: pd.DataFrame, index: pd.DatetimeIndex) -> pd.DataFrame:
+    # Convert bars into the timezone of an index before concatenating them,
+    # mixing timezones would leave an object index kernels cannot use
+    if (not isinstance(data.index, pd.DatetimeIndex)
+    or  not isinstance(index, pd.DatetimeIndex)
+    or  str(data.index.tz) == str(index.tz)):
+        return data
+    if index.tz is None:
+        return data.set_axis(data.index.tz_localize(None))
+    if data.index.tz is None:
+        return data.set_axis(data.index.tz_localize(index.tz))
+    return data.set_axis(data.index.tz_convert(index.tz))
+
+class DataSource:
+    """
+    Provides price history for a ticker. StockData downloads through a
+    data source so that Yahoo Finance can be swapped for local files in
+    tests and offline benchmarks.
+    """
+    def history(self,
+                ticker: str,
+                start: datetime.datetime,
+                end: datetime.datetime = None) -> pd.DataFrame:
+        """
+        Parameters:
+        ticker (str): The ticker code, without any exchange postfix.
+        start (datetime): The first date to include.
+        end (datetime): The date to stop before, or None for the latest bar.
+
+        Returns:
+        pd.DataFrame: OHLCV bars indexed by date.
+        """
+        raise NotImplementedError
+
+class YahooSource(DataSource):
+    def __init__(self, ticker_postfix: str = '.ax'):
+        self.ticker_postfix = ticker_postfix
+
+    def history(self,
+                ticker: str,
+                start: datetime.datetime,
+                end: datetime.datetime = None) -> pd.DataFrame:
+        return yf.Ticker(ticker + self.ticker_postfix).history(start=start, end=end)
+
+class FileSource(DataSource):
+    """
+    Reads history from files named after their ticker, in any format
+    from CACHE_BACKENDS, e.g. fixtures/CBA.csv.
+    """
+    def __init__(self, directory: str, file_type: str = '.csv'):
+        self.directory = directory
+        self.backend = CACHE_BACKENDS[file_type]
+        self.file_type = file_type
+
+    def history(self,
+                ticker: str,
+                start: datetime.datetime,
+                end: datetime.datetime = None) -> pd.DataFrame:
+        data = self.backend.load(os.path.join(self.directory,
+                                              ticker + self.file_type))
+        mask = data.index >= localise(start, data.index)
+        if end is not None:
+            mask &= data.index < localise(end, data.index)
+        return data[mask]
 
 class StockData:
     CACHE_DIR = './cache/'
-    CACHE_TYPE = '.csv'
+    CACHE_TYPE = '.npz'
     CACHE_INFO_TYPE = '.json'
     DATE_FORMAT = '%Y-%m-%d'
+    # Whether derived indicator columns are written to the cache alongside
+    # the downloaded bars, each time preprocess_indicators() adds some.
+    # Cached indicators are dropped when new bars arrive since they would
+    # no longer cover the full history.
+    CACHE_INDICATORS = False
+    # Whether computed indicators are kept in the indicator store
+    STORE_INDICATORS = True
+    INDICATOR_STORE_DIR = 'indicators/'
+    FINGERPRINT_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
     
     def __init__(self,
                  ticker: str,
                  start: datetime.datetime = None,
-                 ticker_postfix: str = '.ax'):
+                 ticker_postfix: str = '.ax',
+                 refresh: bool = True,
+                 source: DataSource = None,
+                 dtype: type = np.float64):
+        """
+        Bars and indicators are held as contiguous, read-only NumPy arrays,
+        one per column. Use array() to pass them to kernels without pandas
+        overhead, `data` is a DataFrame view over the same memory.
+
+        Parameters:
+        ticker (str): The ticker code, without any exchange postfix.
+        start (datetime): The first date to load, defaulting to 1 year ago.
+        ticker_postfix (str): The exchange postfix used by Yahoo Finance.
+        refresh (bool): Whether to download bars after the end of the cache.
+        source (DataSource): Where to download bars from, defaulting to Yahoo Finance.
+        dtype (type): The dtype prices are held in, e.g. np.float32 to halve
+                      memory for large universes. The cache keeps full precision.
+        """
         self.ticker = ticker
+        if source is None:
+            source = YahooSource(ticker_postfix)
+        self.source = source
         self.cache_path = (StockData.CACHE_DIR
                         +  ticker
                         +  StockData.CACHE_TYPE)
@@ -31,261 +553,496 @@ class StockData:
             start = datetime.datetime.now() - datetime.timedelta(days=365)
         self.start_date = start
 
+        # Cache state, the cache is only written when something changed
+        self.dirty = False          # Data must be fully rewritten
+        self.pending_rows = None    # Rows to append to the cached data
+        self.info_dirty = False     # Only the info must be rewritten
+        self.cached_columns = []
+        self.dtype = np.float64
+
+        # Migrate a cache stored in another format (e.g. older csv caches)
+        if not os.path.exists(self.cache_path):
+            self.migrate_cache()
+
         # Download data if cache does not exist
         if not os.path.exists(self.cache_path):
             print(f"Downloading data for {ticker}"
                   f" beginning {self.start_date.strftime(StockData.DATE_FORMAT)}")
-            ticker = yf.Ticker(ticker + ticker_postfix)
-            history = ticker.history(start=self.start_date)
-
-            self.data = history
+            self.data = self.download(start=self.start_date)
+            self.raw_columns = list(self.data.columns)
+            self.dirty = True
             print(f"Download finished")
 
         # Read from cache
         else:
-            cached_data = pd.read_csv(self.cache_path, index_col=0, parse_dates=True)
+            cached_data = self.cache_backend().load(self.cache_path)
             cached_info = {}
             with open(self.cache_info_path, 'r') as cache_info:
                 cached_info = json.load(cache_info)
             cached_start_date = datetime.datetime.strptime(cached_info['start-date'],
                                                            StockData.DATE_FORMAT)
+            self.data = cached_data
+            self.refresh_date = cached_info.get('refresh-date')
+            self.raw_columns = cached_info.get('raw-columns',
+                                               list(cached_data.columns))
+            self.cached_columns = list(cached_data.columns)
 
-            # Download data outside of desired date range
+            # Discard indicators saved under a different policy
+            if not StockData.CACHE_INDICATORS:
+                self.data = self.data[self.raw_columns]
+
+            # Download data before the start of the cache
             if self.start_date < cached_start_date:
                 print(f"Downloading data for {ticker}"
                       f" beginning {self.start_date.strftime(StockData.DATE_FORMAT)}"
                       f" ending {cached_start_date.strftime(StockData.DATE_FORMAT)}")
-                ticker = yf.Ticker(ticker + ticker_postfix)
-                before = ticker.history(start=self.start_date,
-                                        end=cached_start_date)
-                # TODO: after end date
-
-                self.data = pd.concat((before, cached_data))
+                before = self.download(start=self.start_date,
+                                       end=cached_start_date)
+                before = conform(before, cached_data.index)
+                before = before[before.index < cached_data.index[0]]
+
+                self.data = pd.concat((before.reindex(columns=self.raw_columns),
+                                       self.data[self.raw_columns]))
+                self.dirty = True
                 print(f"Download finished")
 
             # Align dates with cache
             else:
                 self.start_date = cached_start_date
-                # TODO: end date
-                self.data = cached_data
+
+            # Download data from the end of the cache
+            if refresh and self.is_stale():
+                self.refresh_tail()
+
+        self.indicator_store = IndicatorStore(StockData.CACHE_DIR
+                                            + StockData.INDICATOR_STORE_DIR
+                                            + ticker)
 
         # Generate info and cache data
+        if len(self) > 0:
+            self.end_date = self.index[-1].to_pydatetime()
+        else:
+            self.end_date = self.start_date
+        if self.dirty:
+            self.refresh_date = datetime.datetime.now().strftime(StockData.DATE_FORMAT)
         self.info = {
             'start-date': self.start_date.strftime(StockData.DATE_FORMAT),
-            'end-date': 'todo'
+            'end-date': self.end_date.strftime(StockData.DATE_FORMAT),
+            'refresh-date': self.refresh_date,
+            'raw-columns': self.raw_columns
         }
         self.cache_data()
 
+        # Reduce precision only after the full precision bars are cached
+        if dtype != np.float64:
+            self.astype(dtype)
+
+    def download(self,
+                 start: datetime.datetime,
+                 end: datetime.datetime = None) -> pd.DataFrame:
+        return self.source.history(self.ticker, start, end)
+
+    def is_stale(self) -> bool:
+        """
+        A cache is stale unless it was refreshed today. Holding a bar for
+        today is not enough, since it may have been downloaded during trading.
+        """
+        today = datetime.datetime.now().strftime(StockData.DATE_FORMAT)
+        return self.refresh_date != today and len(self) > 0
+
+    def refresh_tail(self):
+        """
+        Download the bars from the last cached bar onwards. The last cached
+        bar is downloaded again, and the new bars are only appended if it
+        still matches. Otherwise, or if there was a dividend or split since,
+        Yahoo Finance has adjusted the history onto a new price basis (or
+        the bar was partial), so the full history is downloaded again.
+        """
+        last_bar = self.index[-1]
+        start = last_bar.to_pydatetime().replace(tzinfo=None)
+        print(f"Downloading data for {self.ticker}"
+              f" beginning {start.strftime(StockData.DATE_FORMAT)}")
+        tail = self.download(start=start)
+        print(f"Download finished")
+
+        # Record the refresh even when nothing new was found
+        self.refresh_date = datetime.datetime.now().strftime(StockData.DATE_FORMAT)
+        self.info_dirty = True
+
+        tail = conform(tail, self.index)
+        tail = tail[tail.index >= last_bar].reindex(columns=self.raw_columns)
+        if len(tail) == 0:
+            return
+        if not self.continues(tail):
+            self.redownload()
+            return
+
+        # Replace the last bar if it changed, e.g. its volume
+        new_rows = tail[tail.index > last_bar]
+        if not self.matches_last(tail.iloc[0], self.raw_columns):
+            self.data = pd.concat((self.data.iloc[:-1][self.raw_columns], tail))
+            self.dirty = True
+        elif len(new_rows) > 0:
+            # Cached indicators do not cover the new bars
+            if len(self.columns) != len(self.raw_columns):
+                self.dirty = True
+            self.data = pd.concat((self.data[self.raw_columns], new_rows))
+            self.pending_rows = None if self.dirty else new_rows
+
+    def continues(self, tail: pd.DataFrame) -> bool:
+        """
+        Whether downloaded bars, starting with the last cached bar, are on
+        the same price basis as the cache.
+        """
+        if tail.index[0] != self.index[-1]:
+            return False
+        for column in ('Dividends', 'Stock Splits'):
+            if column in tail.columns and tail[column].iloc[1:].fillna(0).any():
+                return False
+        prices = [column for column in ('Open', 'High', 'Low', 'Close')
+                  if column in self.raw_columns]
+        return self.matches_last(tail.iloc[0], prices)
+
+    def matches_last(self, bar: pd.Series, columns: list) -> bool:
+        # Compare a downloaded bar with the last bar, allowing for the
+        # rounding of older csv caches
+        return np.allclose(bar[columns].to_numpy(np.float64),
+                           self.data[columns].iloc[-1].to_numpy(np.float64),
+                           rtol=1e-9, equal_nan=True)
+
+    def redownload(self):
+        # Replace the cached history, and any cached indicators, in full
+        print(f"Downloading data for {self.ticker}"
+              f" beginning {self.start_date.strftime(StockData.DATE_FORMAT)}")
+        self.data = self.download(start=self.start_date).reindex(columns=self.raw_columns)
+        self.dirty = True
+        self.pending_rows = None
+        print(f"Download finished")
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """
+        DataFrame view over the column arrays, for plotting and
+        compatibility. Columns should be added with set_column() since
+        the view is rebuilt whenever the columns change.
+        """
+        if self.frame is None:
+            self.frame = pd.DataFrame(self.columns, index=self.index, copy=False)
+        return self.frame
+
+    @data.setter
+    def data(self, data: pd.DataFrame):
+        if not isinstance(data.index, pd.DatetimeIndex) and len(data) > 0:
+            raise TypeError(f"{self.ticker} bars must be indexed by date,"
+                            f" not {data.index.dtype} (mixed timezones?)")
+        self.index = data.index
+        self.columns = {col: kernels.read_only(data[col].to_numpy())
+                        for col in data.columns}
+        self.frame = None
+        self.fingerprints = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def set_column(self, column: str, values):
+        if isinstance(values, pd.Series):
+            values = values.to_numpy()
+        self.columns[column] = kernels.read_only(values)
+        self.frame = None
+
+    def astype(self, dtype: type):
+        # Convert floating point columns, leaving volume and other integers
+        self.dtype = dtype
+        for column, values in self.columns.items():
+            if np.issubdtype(values.dtype, np.floating):
+                self.columns[column] = kernels.read_only(values.astype(dtype))
+        self.frame = None
+        self.fingerprints = {}
+
+    def array(self, indicators: tuple) -> tuple:
+        """
+        The same as indexing, but returns raw NumPy arrays for kernels.
+        """
+        # Return a single indicator if only one is given
+        if isinstance(indicators, str):
+            return self.columns[indicators]
+        # Return a tuple of indicators
+        return tuple(self.columns[i] for i in indicators)
+
     def __getitem__(self, indicators: tuple) -> tuple:
         # Return a single indicator if only one is given
         if isinstance(indicators, str):
-            return self.data[indicators]
+            return pd.Series(self.columns[indicators],
+                             index=self.index,
+                             name=indicators,
+                             copy=False)
         # Return a tuple of indicators
-        return tuple(self.data[i] for i in indicators)
+        return tuple(self[i] for i in indicators)
+
+    @staticmethod
+    def cache_backend():
+        if StockData.CACHE_TYPE not in CACHE_BACKENDS:
+            raise ValueError(f"Unknown cache type: {StockData.CACHE_TYPE}")
+        return CACHE_BACKENDS[StockData.CACHE_TYPE]
+
+    def migrate_cache(self):
+        """
+        Convert a cache stored in any other known format into CACHE_TYPE.
+        The old file is left in place.
+        """
+        for cache_type, backend in CACHE_BACKENDS.items():
+            old_cache_path = StockData.CACHE_DIR + self.ticker + cache_type
+            if (cache_type == StockData.CACHE_TYPE
+            or  not os.path.exists(old_cache_path)):
+                continue
+
+            print(f"Migrating {old_cache_path} to {self.cache_path}")
+            self.cache_backend().save(self.cache_path,
+                                      backend.load(old_cache_path))
+            return
 
-    def cache_data(self):
-        # Store data
-        self.data.to_csv(self.cache_path)
+    def cache_columns(self) -> list:
+        # Columns which should be written to the cache
+        if StockData.CACHE_INDICATORS:
+            return list(self.columns)
+        return self.raw_columns
 
+    def is_dirty(self) -> bool:
+        return (self.dirty
+             or self.pending_rows is not None
+             or self.info_dirty
+             or self.cache_columns() != self.cached_columns)
+
+    def cache_data(self, force: bool = False):
+        """
+        Write the data to the cache if it has changed since it was loaded.
+
+        Parameters:
+        force (bool): Rewrite the full cache even if nothing has changed.
+        """
+        if not force and not self.is_dirty():
+            return
+        os.makedirs(StockData.CACHE_DIR, exist_ok=True)
+
+        # Store data, appending when only new rows need to be written
+        columns = self.cache_columns()
+        if (force
+        or  self.dirty
+        or  columns != self.cached_columns
+        or  not os.path.exists(self.cache_path)):
+            self.cache_backend().save(self.cache_path, self.data[columns])
+        elif self.pending_rows is not None:
+            self.cache_backend().append(self.cache_path, self.pending_rows)
+
+        self.cache_info()
+
+        self.dirty = False
+        self.pending_rows = None
+        self.info_dirty = False
+        self.cached_columns = columns
+
+    def cache_info(self):
         # Store info
         with open(self.cache_info_path, 'w') as cache_info:
             json.dump(self.info, cache_info)
         
     def preprocess_indicators(self,
                               indicators: Iterable,
-                              force: bool = False):
-        for i in indicators:
-            if isinstance(i, str):
-                self.preprocess_indicator(i, force)
+                              force: bool = False) -> list:
+        """
+        Compute the given indicators and everything they depend on. Each
+        indicator shared between them is only computed once.
+
+        Parameters:
+        indicators (Iterable): Indicator names, e.g. 'ema20', 'd_ema200' or
+                               'boll20,2.0'. Anything other than a str is ignored.
+        force (bool): Recompute the given indicators even if they exist.
+
+        Returns:
+        list: The indicators which could be preprocessed.
+        """
+        names = []
+        for indicator in indicators:
+            if not isinstance(indicator, str):
+                continue
+            try:
+                ind.plan((indicator, ), self.columns)
+                names.append(indicator)
+            except ValueError as e:
+                print(f"Could not preprocess indicator: {indicator} ({e})")
+
+        # Forced indicators are treated as missing
+        forced = set()
+        if force:
+            forced = {ind.parse(name).name for name in names} | set(names)
+        available = [column for column in self.columns if column not in forced]
+
+        nodes = ind.plan(names, available)
+        done = set()
+
+        # EMAs only depend on downloaded columns, so every EMA which is not
+        # stored is computed together in a single pass
+        emas = []
+        for node in nodes:
+            if isinstance(node, ind.Ema):
+                if not self.restore_indicator(node, forced):
+                    emas.append(node.period)
+                done.add(node.name)
+        if len(emas) > 0:
+            self.ema_bank(emas, add_columns=True)
+
+        for node in nodes:
+            if (not node.produces_column
+            or  node.name in done
+            or  self.restore_indicator(node, forced)):
+                continue
+            self.set_column(node.name, node.compute(self.columns))
+            self.store_indicator(node.name, node.version)
+
+        # Alternative names share the canonical column, e.g. atr for atr14
+        for name in names:
+            node = ind.parse(name)
+            if (node.produces_column
+            and name != node.name
+            and node.name in self.columns):
+                self.set_column(name, self.columns[node.name])
+
+        # Keep the new columns, unless precision was reduced after loading
+        if StockData.CACHE_INDICATORS and self.dtype == np.float64:
+            self.cache_data()
+
+        return names
+
+    def restore_indicator(self, node: ind.Indicator, forced: set = ()) -> bool:
+        return (node.name not in forced
+            and StockData.STORE_INDICATORS
+            and self.load_indicator(node))
+
+    def store_indicator(self, indicator: str, version: int = 1):
+        if StockData.STORE_INDICATORS:
+            self.indicator_store.save(indicator,
+                                      self.columns[indicator],
+                                      self.fingerprint(len(self)),
+                                      version)
+
+    def ema_bank(self, spans: Iterable, add_columns: bool = False) -> np.ndarray:
+        """
+        Exponential moving averages of the close for many spans, computed
+        together in one compiled pass. Each column matches ema<span>.
+
+        Parameters:
+        spans (Iterable): The span of each average.
+        add_columns (bool): Also add each average as an ema<span> column.
+
+        Returns:
+        np.ndarray: Array of shape (bars, spans).
+        """
+        spans = np.array(list(spans), dtype=np.int64)
+        bank = kernels.ema_bank(self.columns['Close'].astype(np.float64, copy=False),
+                                spans)
+        if add_columns:
+            for k, span in enumerate(spans):
+                self.set_column(f"ema{span}", bank[:, k])
+                self.store_indicator(f"ema{span}", ind.Ema.version)
+        return bank
+
+    def online(self, indicators: Iterable) -> ind.OnlineIndicators:
+        """
+        Online state for the given indicators, continuing from the last bar.
+        Update it with each new bar instead of recomputing the history.
+        """
+        names = self.preprocess_indicators(indicators)
+        return ind.OnlineIndicators(names, self.columns)
 
     def preprocess_indicator(self,
                              indicator: str,
                              force: bool = False) -> str:
-        # Indicator already exists
-        if indicator in self.data.columns and not force:
-            return indicator
-
-        # Exponential Moving Average
-        if indicator.startswith('ema'):
-            ema_period = indicator[3:]
-            if (len(ema_period) == 0
-            or  not ema_period.isnumeric()):
-                print(f"Could not preprocess indicator: {indicator}")
-                return
-
-            self.data[indicator] = self.ind_ema(int(ema_period))
-            return indicator
-            
-        # Simple Moving Average
-        if indicator.startswith('sma'):
-            pass
-
-        # Standard Deviation
-        if indicator.startswith('std'):
-            pass
-
-        # Differential indicator
-        if indicator.startswith('d_'):
-            primary_indicator = indicator[2:]
-            if self.preprocess_indicator(primary_indicator) is None:
-                print(f"Could not preprocess indicator: {indicator}")
-                return
-
-            self.data[indicator] = self.ind_d(self.data[primary_indicator])
-            return indicator
-
-        # True Range
-        if indicator == 'tr':
-            self.data[indicator] = self.ind_tr()
-            return indicator
-
-        # Average True Range
-        if indicator.startswith('atr'):
-            self.data[indicator] = self.average_true_range(self.data['High'],
-                                                           self.data['Low'],
-                                                           self.data['Close'],
-                                                           14)
-            return indicator
-
-            # Preprocess TR
-            self.preprocess_indicator('tr')
-
-            atr_period = indicator[3:]
-            if (len(atr_period) == 0
-            or  not atr_period.isnumeric()):
-                print(f"Could not preprocess indicator: {indicator}")
-                return
-            
-            self.data[indicator] = self.ind_atr(int(atr_period))
-            return indicator
-
-        # Bollinger Bands (in progress)
-        if indicator.startswith('boll'):
-            if len(indicator[4:]) == 0:
-                self.generate_ind_boll()
-                return indicator
-            comma_i = indicator.find(',')
-            boll_period = indicator[4:comma_i]
-            boll_sd = indicator[comma_i + 1:]
-            if (not boll_period.isnumeric()
-            or  not boll_period.replace('.', '', 1).isnumeric()):
-                print(f"Could not preprocess indicator: {indicator}")
-                return
-            
-            self.generate_ind_boll(int(boll_period), float(boll_sd))
-
-    def ind_ema(self, period: int) -> pd.Series:
-        ema = self.data['Close'].ewm(span=period,
-                                     adjust=False,
-                                     min_periods=period).mean()
-        # ema[:period] = np.nan
-        return ema
-
-    def ind_sma(self):
-        pass # TODO
-
-    def ind_d(self,
-              primary_indicator: pd.Series,
-              periods: int = 1) -> pd.Series:
-        return primary_indicator.diff(periods=periods)
-
-    # def ind_tr(self):
-    #     prev_close = self.data['Close'].shift(periods=1)
-    #     return (np.maximum(self.data['High'], prev_close)
-    #          -  np.minimum(self.data['Low'], prev_close))
+        if len(self.preprocess_indicators((indicator, ), force)) == 0:
+            return None
+        return indicator
 
-
-    @staticmethod
-    def average_true_range(high: pd.Series, low: pd.Series, close: pd.Series, period: int = 14) -> pd.Series:
+    def fingerprint(self, bars: int) -> str:
         """
-        Calculate the Average True Range (ATR) using pandas for efficiency.
-        
-        Parameters:
-        high (pd.Series): Array of high prices.
-        low (pd.Series): Array of low prices.
-        close (pd.Series): Array of closing prices.
-        period (int): The number of periods to use for ATR calculation (default is 14).
-        
+        Hash of the dates and OHLCV values of the first `bars` bars.
+        """
+        if bars not in self.fingerprints:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(self.index.asi8[:bars].tobytes())
+            for column in StockData.FINGERPRINT_COLUMNS:
+                if column in self.columns:
+                    digest.update(self.columns[column][:bars].tobytes())
+            self.fingerprints[bars] = f"{bars}:{digest.hexdigest()}"
+        return self.fingerprints[bars]
+
+    def load_indicator(self, node: ind.Indicator) -> bool:
+        """
+        Load an indicator from the indicator store, computing only the bars
+        added since it was stored when the indicator allows it.
+
         Returns:
-        pd.Series: Array containing the ATR values.
+        bool: Whether the indicator was loaded.
         """
-        tr = pd.concat([
-            high - low,
-            (high - close.shift()).abs(),
-            (low - close.shift()).abs()
-        ], axis=1).max(axis=1)
-        
-        atr = tr.ewm(span=period, adjust=False).mean()
-        
-        return atr
+        stored = self.indicator_store.load(node.name)
+        if stored is None:
+            return False
+        values, fingerprint, version = stored
+
+        # Stored over bars which are no longer the start of the data
+        bars = values.size
+        if (version != node.version
+        or  bars > len(self)
+        or  fingerprint != self.fingerprint(bars)):
+            return False
+
+        if bars < len(self):
+            if bars == 0 or np.isnan(values[-1]):
+                return False
+            suffix = node.extend(values, self.columns)
+            if suffix is None:
+                return False
+            values = np.concatenate((values, suffix))
+            self.indicator_store.save(node.name,
+                                      values,
+                                      self.fingerprint(len(self)),
+                                      node.version)
+
+        self.set_column(node.name, values)
+        return True
+
+    def view(self, first: int, last: int) -> 'StockView':
+        """
+        The bars from first (inclusive) to last (exclusive) as a StockData
+        sharing this stock's arrays, e.g. to backtest one window.
+        """
+        return StockView(self, first, last)
 
+    def position(self, date: datetime.datetime) -> int:
+        """
+        Binary search for the position of the first bar on or after date.
+        """
+        date = localise(date, self.index).as_unit(self.index.unit)
+        return int(np.searchsorted(self.index.asi8, date.asm8.view(np.int64)))
 
-    
-    @staticmethod
-    @numba.njit(fastmath=True, parallel=True)
-    def compute_tr(high, low, close):
-        tr = np.maximum(high - low, 
-                        np.maximum(np.abs(high - close), 
-                                   np.abs(low - close)))
-        return tr
+    def slice(self,
+              start: datetime.datetime = None,
+              end: datetime.datetime = None) -> 'StockView':
+        """
+        The bars from start up to but not including end as a view sharing
+        this stock's arrays and indicator columns. Nothing is copied.
 
-    @staticmethod
-    @numba.njit(fastmath=True, parallel=True)
-    def compute_atr(tr, period):
-        atr = np.empty_like(tr, dtype=np.float64)
-        atr[0] = np.mean(tr[:period])  # Initial ATR value
-        
-        for i in numba.prange(1, len(tr)):
-            atr[i] = (atr[i-1] * (period - 1) + tr[i]) / period  # Smoothed ATR formula
-    
-        return atr
-    
-    def ind_tr(self):
-        prev_close = self.data['Close'].shift(periods=1)
-        return self.compute_tr(self.data['High'].to_numpy(),
-                               self.data['Low'].to_numpy(),
-                               prev_close.to_numpy())
-
-    def ind_atr(self, period: int = 14):
-        return self.compute_atr(self.data['tr'].to_numpy(), period)
-
-    # def ind_atr(self, period: int = 14):
-    #     # Standard ATR calculation
-    #     # self.data['atr'] = np.nan
-    #     # self.data.loc[13, 'atr'] = np.mean(self.data['tr'].iloc[:14])
-
-    #     # i = 14
-    #     # end = self.data.shape[0]
-
-    #     # print("began standard atr")
-    #     # while i < end:
-    #     #     self.data.loc[i, 'atr'] = (self.data['atr'].iloc[i - 1] * period + self.data['tr'].iloc[i]) / period
-    #     #     i += 1
-    #     # print("finished standard atr")
-
-    #     # Custom ATR calculation
-    #     # print("begin custom atr")
-    #     atr = self.data['tr'].ewm(alpha=1 / period,
-    #                                      adjust=False,
-    #                                      min_periods=period).mean()
-    #     # custom_atr[:period] = np.nan
-    #     # print("end custom atr")
-    #     return atr
-
-    def generate_ind_boll(self, period: int = 20, sd: float = 2, sd_period: int = -1):
-        if sd_period < 0:
-            sd_period = period
-        indicator_sma = f"sma{period}"
-        indicator_std = f"std{sd_period}sma{period}"
-        indicator_plus  = f"boll+{period},{sd:.1f}"
-        indicator_minus = f"boll-{period},{sd:.1f}"
-
-        self.preprocess_indicator(indicator_sma)
-        self.preprocess_indicator(indicator_std)
-        self.data[indicator_plus]  = (self.data[indicator_sma]
-                                   +  sd * self.data[indicator_std])
-        self.data[indicator_minus] = (self.data[indicator_sma]
-                                   -  sd * self.data[indicator_std])
+        Parameters:
+        start (datetime): The first date, defaulting to the first bar.
+        end (datetime): The date to end before, defaulting to after the last bar.
+
+        Returns:
+        StockView: The bars between the dates.
+        """
+        first = 0 if start is None else self.position(start)
+        last = len(self) if end is None else self.position(end)
+        return self.view(first, last)
+
+    def generate_ind_boll(self, period: int = 20, sd: float = 2):
+        return self.preprocess_indicator(f"boll{period},{sd:.1f}")
 
     def plot_indicators(self, indicators: list, fig = None, ax = None, colours: list = None):
         if fig is None:
@@ -296,34 +1053,267 @@ class StockData:
         if colours is None:
             colours = ['k:', 'g-', 'y-', 'b-', 'm-', 'p-', 'r-']
 
-        for i, ind in enumerate(indicators):
-            ax.plot(self.data.index,
-                    self.data[ind],
+        for i, name in enumerate(indicators):
+            ax.plot(self.index,
+                    self.columns[name],
                     colours[i],
-                    label=ind)
+                    label=name)
         
         return fig, ax
 
-    def plot_signals(self, entries: list, exits: list, fig = None, ax = None, entry_fmt: str = 'bo', exit_fmt: str = 'ro', markersize: int = 4):
+    def plot_signals(self, entries, exits, fig = None, ax = None, entry_fmt: str = 'bo', exit_fmt: str = 'ro', markersize: int = 4):
         if fig is None:
             fig = plt.figure()
         if ax is None:
             ax = fig.add_subplot()
-        
-        for i in entries:
-            ax.plot(pd.Timestamp(i),
-                    self.data['Close'][i],
-                    entry_fmt,
-                    markersize=markersize)
 
-        for i in exits:
-            ax.plot(pd.Timestamp(i),
-                    self.data['Close'][i],
-                    exit_fmt,
+        # Plot every entry and every exit in one call each
+        close = self.columns['Close']
+        for signals, fmt in ((entries, entry_fmt), (exits, exit_fmt)):
+            positions = signal_positions(signals, self.index)
+            ax.plot(self.index[positions],
+                    close[positions],
+                    fmt,
                     markersize=markersize)
         
         return fig, ax
 
+class ColumnViews(Mapping):
+    """
+    The columns of a StockData over a window of bars. Each column is only
+    sliced when it is first used, and again if the stock replaces it.
+    """
+    def __init__(self, columns: dict, first: int, last: int):
+        self.source = columns
+        self.first  = first
+        self.last   = last
+        self.views  = {}
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        values = self.source[column]
+        view = self.views.get(column)
+        if view is None or view[0] is not values:
+            view = (values, values[self.first:self.last])
+            self.views[column] = view
+        return view[1]
+
+    def __contains__(self, column) -> bool:
+        return column in self.source
+
+    def __iter__(self):
+        return iter(self.source)
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+class StockView(StockData):
+    """
+    A window of bars of a StockData, sharing its column arrays rather than
+    copying them. Indicators are always computed over the full stock, so a
+    window's indicators are warmed up by the bars before it, and are shared
+    with every other window. Views never write the cache or indicator store.
+
+    Creating a view only stores its bounds, the index and columns are
+    sliced when first used.
+    """
+    def __init__(self, stock: StockData, first: int, last: int):
+        first, last, _ = slice(first, last).indices(len(stock))
+        self.stock        = stock
+        self.first        = first
+        self.last         = max(first, last)
+        self.ticker       = stock.ticker
+        self.source       = stock.source
+        self.raw_columns  = stock.raw_columns
+        self.columns      = ColumnViews(stock.columns, self.first, self.last)
+        self.window_index = None
+        self.fingerprints = {}
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        if self.window_index is None:
+            self.window_index = self.stock.index[self.first:self.last]
+        return self.window_index
+
+    @property
+    def data(self) -> pd.DataFrame:
+        return self.stock.data.iloc[self.first:self.last]
+
+    def __len__(self) -> int:
+        return self.last - self.first
+
+    def view(self, first: int, last: int) -> 'StockView':
+        # Views of views refer straight to the stock
+        first, last, _ = slice(first, last).indices(len(self))
+        return StockView(self.stock, self.first + first, self.first + max(first, last))
+
+    def position(self, date: datetime.datetime) -> int:
+        return min(max(self.stock.position(date) - self.first, 0), len(self))
+
+    def preprocess_indicators(self,
+                              indicators: Iterable,
+                              force: bool = False) -> list:
+        return self.stock.preprocess_indicators(indicators, force)
+
+    def ema_bank(self, spans: Iterable, add_columns: bool = False) -> np.ndarray:
+        return self.stock.ema_bank(spans, add_columns)[self.first:self.last]
+
+    def set_column(self, column: str, values):
+        raise TypeError("Columns of a StockView are set on its StockData")
+
+    def astype(self, dtype: type):
+        raise TypeError("The dtype of a StockView is set on its StockData")
+
+    def cache_data(self, force: bool = False):
+        return
+
+    def store_indicator(self, indicator: str, version: int = 1):
+        return
+
+class StockUniverse:
+    """
+    Loads and refreshes the StockData for many tickers concurrently.
+    Downloads are mostly spent waiting on the network, so a bounded
+    thread pool lets hundreds of tickers load in roughly the time of
+    the slowest few.
+    """
+    def __init__(self,
+                 tickers: Iterable,
+                 start: datetime.datetime = None,
+                 source: DataSource = None,
+                 max_workers: int = 16,
+                 refresh: bool = True):
+        self.tickers     = list(tickers)
+        self.start       = start
+        self.source      = source if source is not None else YahooSource()
+        self.max_workers = max_workers
+        self.refresh     = refresh
+        self.stocks      = {}
+
+    def load_one(self, ticker: str) -> StockData:
+        return StockData(ticker,
+                         self.start,
+                         refresh=self.refresh,
+                         source=self.source)
+
+    def load(self) -> dict:
+        """
+        Load every ticker, skipping any which fail to load.
+
+        Returns:
+        dict: StockData keyed by ticker, in the order the tickers were given.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [(ticker, executor.submit(self.load_one, ticker))
+                       for ticker in self.tickers]
+
+            for ticker, future in futures:
+                try:
+                    self.stocks[ticker] = future.result()
+                except Exception as e:
+                    print(f"Could not load {ticker}: {e}")
+
+        return self.stocks
+
+    def __getitem__(self, ticker: str) -> StockData:
+        return self.stocks[ticker]
+
+    def __iter__(self):
+        return iter(self.stocks)
+
+    def __len__(self) -> int:
+        return len(self.stocks)
+
+    def items(self):
+        return self.stocks.items()
+
+    def align(self) -> tuple:
+        """
+        Align every loaded stock onto the union of their dates.
+
+        Returns:
+        tuple: (index, positions) where positions maps each ticker to the
+               position of each of its bars in the index.
+        """
+        if not self.stocks:
+            return pd.DatetimeIndex([]), {}
+
+        indexes = [stock.index for stock in self.stocks.values()]
+        index = indexes[0]
+        for other in indexes[1:]:
+            index = index.union(other)
+
+        positions = {ticker: index.get_indexer(stock.index)
+                     for ticker, stock in self.stocks.items()}
+        return index, positions
+
+    def panel(self, indicators: tuple = ('Close', )) -> tuple:
+        """
+        Indicators of every loaded stock as (tickers, bars) arrays over the
+        union of their dates, NaN where a stock has no bar.
+
+        Returns:
+        tuple: (index, panels) where panels maps each indicator to its array,
+               with rows in the order of the tickers.
+        """
+        index, positions = self.align()
+        panels = {}
+        for indicator in indicators:
+            panel = np.full((len(self.stocks), len(index)), np.nan)
+            for row, (ticker, stock) in enumerate(self.stocks.items()):
+                stock.preprocess_indicators((indicator, ))
+                panel[row, positions[ticker]] = stock.array(indicator)
+            panels[indicator] = panel
+        return index, panels
+
+    def backtest(self,
+                 strategy,
+                 max_positions: int = 10,
+                 capital: float = 1.0) -> tuple:
+        """
+        Run one strategy over every loaded stock as a single portfolio
+        sharing its capital.
+
+        Parameters:
+        strategy: Any strategy backtest_strategy() accepts, e.g. SoloMini.
+        max_positions (int): The most stocks held at once. New positions get
+                             an equal share of the free cash, and entries on
+                             the same bar are taken in ticker order.
+        capital (float): The starting cash.
+
+        Returns:
+        tuple: (curve, trades) where curve is a DataFrame of the equity, cash
+               and positions held each bar, and trades a DataFrame of every
+               closed trade.
+        """
+        index, positions = self.align()
+        tickers = list(self.stocks)
+        close = np.full((len(tickers), len(index)), np.nan)
+        entries = np.zeros(close.shape, dtype=np.bool_)
+        exits = np.zeros(close.shape, dtype=np.bool_)
+
+        # Signals of each stock, scattered into the panel
+        for row, ticker in enumerate(tickers):
+            stock = self.stocks[ticker]
+            stock_entries, stock_exits = backtest_strategy(strategy, stock)
+            close[row, positions[ticker]] = stock.array('Close')
+            entries[row, positions[ticker][signal_positions(stock_entries, stock.index)]] = True
+            exits[row, positions[ticker][signal_positions(stock_exits, stock.index)]] = True
+
+        (equity, cash, held, trade_tickers, trade_entries,
+         trade_exits, outcomes) = kernels.portfolio(close, entries, exits, max_positions, capital)
+
+        curve = pd.DataFrame({'equity': equity, 'cash': cash, 'positions': held},
+                             index=index)
+        trades = pd.DataFrame({
+            'ticker':      np.array(tickers, dtype=object)[trade_tickers],
+            'entry':       index[trade_entries],
+            'exit':        index[trade_exits],
+            'entry_price': close[trade_tickers, trade_entries],
+            'exit_price':  close[trade_tickers, trade_exits],
+            'return':      outcomes - 1
+        })
+        return curve, trades
+
 
 
 """
@@ -334,78 +1324,169 @@ class Strategy:
                  buy_signal: Callable,
                  sell_signal: Callable,
                  buy_parameters: tuple,
-                 sell_parameters: tuple):
+                 sell_parameters: tuple,
+                 indices: bool = False):
+        """
+        Parameters:
+        buy_signal (Callable): Takes the buy parameters and returns the buys.
+        sell_signal (Callable): Takes the buys and the sell parameters and
+                                returns the sells.
+        buy_parameters (tuple): Indicators passed to buy_signal.
+        sell_parameters (tuple): Indicators passed to sell_signal.
+        indices (bool): The signals take NumPy arrays and return bar indexes,
+                        e.g. solo.buy_indices, rather than taking Series and
+                        returning dates.
+        """
         self.buy_signal      = buy_signal
         self.sell_signal     = sell_signal
         self.buy_parameters  = buy_parameters
         self.sell_parameters = sell_parameters
+        self.indices         = indices
 
     def run(self, data: StockData) -> tuple:
+        """
+        Returns:
+        tuple: The buys and sells as Signals.
+        """
+        buys, sells = self.run_indices(data)
+        return Signals(buys, data.index), Signals(sells, data.index)
+
+    def run_indices(self, data: StockData) -> tuple:
+        """
+        Run the strategy and return the buys and sells as bar indexes.
+        Index signals are given the raw arrays, so no pandas is touched.
+        """
         # Prepare the required indicators for the strategy
         data.preprocess_indicators(self.buy_parameters)
         data.preprocess_indicators(self.sell_parameters)
-        
+
+        if self.indices:
+            buys  = self.buy_signal(*data.array(self.buy_parameters))
+            sells = self.sell_signal(buys, *data.array(self.sell_parameters))
+            return buys, sells
+
         buys  = self.buy_signal(*data[self.buy_parameters])
         sells = self.sell_signal(buys, *data[self.sell_parameters])
 
-        return buys, sells
+        return signal_positions(buys, data.index), signal_positions(sells, data.index)
 
-    def run_and_evaluate(self, data: StockData):
-        buys, sells = self.run(data)
+    def run_and_evaluate(self, data: StockData, store: 'ResultStore' = None):
+        """
+        Parameters:
+        data (StockData): The stock to run on.
+        store (ResultStore): Reuse the stored result of this strategy on the
+                             same bars if there is one, otherwise store it.
 
-        # Order the interactions
-        interactions = []
-        for buy in buys:
-            interactions.append((buy, 'b'))
-        for sell in sells:
-            interactions.append((sell, 's'))
-        interactions.sort(key=lambda x: x[0])
-
-        value = 1
-        losses = 0
-        wins = 0
-        neutral = 0
-
-        hold_value = 0
-
-        for date, signal in interactions:
-            # Buy signal
-            if signal == 'b':
-                # Already holding
-                if hold_value > 0:
-                    # print("rebought ignored")
-                    continue
-
-                # Not holding
-                elif hold_value == 0:
-                    hold_value = data.data.loc[date, 'Close']
-                    # print(f"bought at {hold_value}")
-
-            # Sell signal
-            if signal == 's':
-                # Not holding
-                if hold_value == 0:
-                    # print("ignoring invalid sell")
-                    continue
-
-                # Calculate outcome of sell
-                outcome = (data.data.loc[date, 'Close'] / hold_value)
-
-                losses += int(outcome < 1)
-                wins += int(outcome > 1)
-                neutral += int(outcome == 1)
-
-                value *= outcome
-                hold_value = 0
-
-                # print(f"sold at {data.data.loc[date, 'Close']} for {outcome} result")
-                # print()
-
-        # print(f"Final Value: {value}")
-        # print(f"Wins: {wins}, Losses: {losses}, Neutral: {neutral}")
-        
+        Returns:
+        tuple: The buys and sells as Signals, and the compounded value.
+        """
+        if store is not None:
+            key = ResultStore.key(self, data)
+            stored = store.get(key)
+            if stored is not None and stored['entries'] is not None:
+                return (Signals(stored['entries'], data.index),
+                        Signals(stored['exits'], data.index),
+                        stored['value'])
+
+        buys, sells = self.run(data)
+        trades, value, wins, losses, neutral = execute(buys, sells, data)
+        if store is not None:
+            store.put(key, value, wins, losses, neutral, len(trades),
+                      buys.positions, sells.positions)
         return buys, sells, value
 
+    def identity(self) -> tuple:
+        signals = [f"{signal.__module__}.{signal.__qualname__}"
+                   for signal in (self.buy_signal, self.sell_signal)]
+        return (f"Strategy({', '.join(signals)})",
+                {'buy': list(self.buy_parameters), 'sell': list(self.sell_parameters)})
+
+class CompiledStrategy:
+    """
+    A strategy written as a compiled per-bar rule. The rule decides what
+    to do on one bar, and kernels.strategy_driver() generates the compiled
+    loop around it which tracks the position and stop and records signals.
+
+    For example, an ema crossover holding until a 10% trailing stop:
+
+        @numba.njit
+        def rule(i, inputs, parameters, state, position):
+            close, ema_small, ema_large = inputs
+            if position[kernels.HOLDING] == 0:
+                if ema_small[i] > ema_large[i]:
+                    return kernels.ENTER
+                return kernels.HOLD
+            position[kernels.STOP] = position[kernels.PEAK] * (1 - parameters[2])
+            return kernels.HOLD
+
+        strategy = CompiledStrategy(rule,
+                                    ('Close', 'ema{small}', 'ema{large}'),
+                                    {'small': 10, 'large': 20, 'stop': 0.1})
+    """
+    def __init__(self,
+                 rule: Callable,
+                 inputs: tuple,
+                 parameters: dict = None,
+                 state: dict = None):
+        """
+        Parameters:
+        rule (Callable): A numba.njit function, see kernels.strategy_driver().
+        inputs (tuple): Columns and indicators given to the rule, in order.
+                        Each is formatted with the parameters, e.g. 'ema{small}'.
+        parameters (dict): Parameter values by name, given to the rule as a
+                           float64 array in this order.
+        state (dict): Initial values of the rule's state by name, given to
+                      the rule as a float64 array in this order and kept
+                      between bars.
+        """
+        self.rule       = rule
+        self.inputs     = tuple(inputs)
+        self.parameters = dict(parameters) if parameters is not None else {}
+        self.state      = dict(state) if state is not None else {}
+
+    def __call__(self, **parameters) -> 'CompiledStrategy':
+        """
+        A copy with some parameters changed, so NitolosTester can use a
+        CompiledStrategy as its strategy.
+        """
+        return CompiledStrategy(self.rule,
+                                self.inputs,
+                                {**self.parameters, **parameters},
+                                self.state)
+
+    def indicators(self) -> list:
+        return [name.format(**self.parameters) for name in self.inputs]
+
+    def identity(self) -> tuple:
+        rule = getattr(self.rule, 'py_func', self.rule)
+        return (f"CompiledStrategy({rule.__module__}.{rule.__qualname__})",
+                {'inputs': list(self.inputs),
+                 'parameters': self.parameters,
+                 'state': self.state})
+
+    def backtest_indices(self, stock: StockData) -> tuple:
+        """
+        Returns:
+        tuple: Arrays of the entry and exit bar indexes.
+        """
+        indicators = self.indicators()
+        stock.preprocess_indicators(indicators)
+        inputs = tuple(stock.array(name).astype(np.float64, copy=False)
+                       for name in indicators)
+        driver = kernels.strategy_driver(self.rule)
+        return driver(stock.array('Close').astype(np.float64, copy=False),
+                           inputs,
+                           np.array(list(self.parameters.values()), dtype=np.float64),
+                           np.array(list(self.state.values()), dtype=np.float64))
+
+    def backtest(self, stock: StockData) -> tuple:
+        """
+        Returns:
+        tuple: The entry and exit Signals.
+        """
+        entries, exits = self.backtest_indices(stock)
+        return Signals(entries, stock.index), Signals(exits, stock.index)
+
 class StopLoss:
     def atr_long(entry_price: float,
                  atr_value: float,
@@ -423,60 +1504,542 @@ class StopLoss:
         """
         return entry_price - atr_value * multiplier
 
+    @staticmethod
+    def exits(stock: StockData, entries, rules: Iterable) -> tuple:
+        """
+        Exit trades taken from entry signals on stop rules, computed over
+        every trade at once. Entries while holding are ignored.
+
+        Parameters:
+        stock (StockData): The stock the entries are for.
+        entries: Entry Signals, bar indexes, a boolean mask or dates.
+        rules (Iterable): Rules from stops, e.g. (stops.AtrTrailing(3),
+                          stops.TakeProfit(1.2)).
+
+        Returns:
+        tuple: Arrays of the entry and exit bar indexes of the trades taken.
+        """
+        names = stops.indicators(rules)
+        stock.preprocess_indicators(names)
+        columns = dict(zip(names, stock.array(names)))
+        return stops.exit_indices(columns, signal_positions(entries, stock.index), rules)
+
 class NitolosTester:
-    def __init__(self, strategy, ranges: tuple):
-        self.strategy = strategy
-        self.ranges = ranges
-    
-    def backtest(self):
-        pass
-
-def execute_signals(entries: list, exits: list, stock_data: StockData) -> tuple:
-    # Order the interactions
-    interactions = []
-    for i in entries:
-        interactions.append((i, 'b'))
-    for i in exits:
-        interactions.append((i, 's'))
-    interactions.sort(key=lambda x: x[0])
-
-    value = 1
-    wins = 0
-    losses = 0
-    neutral = 0
-
-    hold_value = 0
-
-    for date, signal in interactions:
-        # Buy signal
-        if signal == 'b':
-            # Already holding
-            if hold_value > 0:
-                # print("rebought ignored")
+    """
+    Backtests a strategy over every combination of its parameters, spread
+    over a pool of worker processes. The pool is started on first use and
+    reused by every later backtest and walk-forward, until close().
+    """
+    # Workers are spawned rather than forked. Forking once the parallel
+    # kernels (e.g. from precompile()) have started numba's thread pool
+    # can deadlock the workers.
+    START_METHOD = 'spawn'
+    # Fewer backtests than this run in this process. Starting the workers
+    # takes seconds (each imports numba and pandas), longer than hundreds
+    # of compiled backtests.
+    MIN_PARALLEL_BACKTESTS = 500
+
+    def __init__(self,
+                 strategy: Callable,
+                 ranges: tuple,
+                 valid: Callable = None,
+                 max_workers: int = None,
+                 chunksize: int = None,
+                 samples: int = 0,
+                 store: ResultStore = None):
+        """
+        Parameters:
+        strategy (Callable): Creates the strategy from keyword parameters,
+                             e.g. SoloMini. The strategy must provide
+                             backtest_indices(stock) or backtest(stock).
+        ranges (tuple): (parameter name, values) pairs, or a dict of them.
+        valid (Callable): Takes the parameters as a dict and returns False
+                          to skip that combination, e.g. small >= large.
+        max_workers (int): Worker processes, defaulting to the core count.
+                           1 runs every combination in this process, as do
+                           fewer than MIN_PARALLEL_BACKTESTS combinations.
+        chunksize (int): Combinations sent to a worker per task, defaulting
+                         to about four tasks per worker.
+        samples (int): Bootstrap samples of each combination's trades, adding
+                       robustness.summary() columns to the results. 0 skips it.
+        store (ResultStore): Skip combinations already stored for the same
+                             bars, and store the rest.
+        """
+        self.strategy    = strategy
+        self.ranges      = dict(ranges)
+        self.valid       = valid
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.chunksize   = chunksize
+        self.samples     = samples
+        self.store       = store
+        self.executor    = None
+        self.directory   = None
+        self.shared      = 0
+
+    def __enter__(self) -> 'NitolosTester':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # Stop the workers and remove the stocks shared with them
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            os.rmdir(self.directory)
+            self.directory = None
+
+    def parallel(self, backtests: int) -> bool:
+        return self.max_workers > 1 and backtests >= NitolosTester.MIN_PARALLEL_BACKTESTS
+
+    def grid(self) -> list:
+        names = list(self.ranges)
+        grid = [dict(zip(names, values))
+                for values in itertools.product(*self.ranges.values())]
+        if self.valid is not None:
+            grid = [parameters for parameters in grid if self.valid(parameters)]
+        return grid
+
+    def backtest(self, stock: StockData) -> pd.DataFrame:
+        """
+        Returns:
+        pd.DataFrame: One row per combination with its parameters, value,
+                      wins, losses, neutral and number of trades, e.g. ready
+                      for results.pivot(index=..., columns=..., values='value').
+        """
+        grid = self.grid()
+        stored = self.stored(stock, grid)
+        missing = [parameters for k, parameters in enumerate(grid) if k not in stored]
+        rows = self.backtest_grid(stock, missing)
+
+        if self.store is not None:
+            self.store.put_many((ResultStore.key(self.strategy(**row['parameters']), stock),
+                                 row['value'], row['wins'], row['losses'], row['neutral'],
+                                 row['trades'], row['entries'], row['exits'],
+                                 row['metrics'])
+                                for row in rows)
+
+        # Combine stored and new rows in grid order
+        rows = iter(rows)
+        rows = [stored[k] if k in stored else next(rows) for k in range(len(grid))]
+        for row in rows:
+            for name in ('parameters', 'metrics', 'entries', 'exits'):
+                row.pop(name, None)
+        return pd.DataFrame(rows)
+
+    def stored(self, stock: StockData, grid: list) -> dict:
+        """
+        Returns:
+        dict: Rows of the combinations found in the store, keyed by their
+              position in the grid.
+        """
+        if self.store is None:
+            return {}
+        stored = {}
+        for k, parameters in enumerate(grid):
+            result = self.store.get(ResultStore.key(self.strategy(**parameters), stock))
+            # Robustness columns are only reused if they were computed
+            if result is None or (self.samples > 0 and 'loss_probability' not in result):
                 continue
+            del result['entries'], result['exits']
+            stored[k] = {**parameters, **result}
+        return stored
+
+    def backtest_grid(self, stock: StockData, grid: list) -> list:
+        if len(grid) == 0:
+            return []
+        self.prepare(stock, grid)
+
+        if not self.parallel(len(grid)):
+            return backtest_chunk(grid, self.strategy, stock, self.samples)
+
+        chunksize = self.chunksize
+        if chunksize is None:
+            chunksize = max(len(grid) // (self.max_workers * 4), 1)
+        chunks = [grid[i:i + chunksize] for i in range(0, len(grid), chunksize)]
+
+        rows = []
+        path = self.share(stock)
+        try:
+            for chunk_rows in self.pool().map(backtest_worker_chunk,
+                                              itertools.repeat(path),
+                                              chunks):
+                rows.extend(chunk_rows)
+        finally:
+            os.remove(path)
+        return rows
+
+    def pool(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(NitolosTester.START_METHOD),
+                initializer=init_tester_worker,
+                initargs=(self.strategy, self.samples))
+        return self.executor
+
+    def share(self, stock: StockData) -> str:
+        """
+        Write the stock for the workers to load, once per worker rather
+        than once per task.
 
-            # Not holding
-            elif hold_value == 0:
-                hold_value = stock_data.data.loc[date, 'Close']
-                # print(f"bought at {hold_value}")
+        Returns:
+        str: The path workers load the stock from.
+        """
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='nitolos-')
+        path = os.path.join(self.directory, f"stock{self.shared}.pickle")
+        self.shared += 1
+        with open(path, 'wb') as stock_file:
+            pickle.dump(stock, stock_file, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    def prepare(self, stock: StockData, grid: list):
+        # Compute every indicator the strategies need once, before the
+        # stock is sent to the workers
+        indicators = set()
+        for parameters in grid:
+            strategy = self.strategy(**parameters)
+            if hasattr(strategy, 'indicators'):
+                indicators.update(strategy.indicators())
+        stock.preprocess_indicators(sorted(indicators))
+
+    def windows(self,
+                stock: StockData,
+                train_bars: int,
+                test_bars: int,
+                step: int = None,
+                anchored: bool = False) -> list:
+        """
+        Returns:
+        list: (train first, test first, test last) bar indexes of each
+              walk-forward window.
+        """
+        step = step if step is not None else test_bars
+        windows = []
+        for first in range(0, len(stock) - train_bars - test_bars + 1, step):
+            windows.append((0 if anchored else first,
+                            first + train_bars,
+                            first + train_bars + test_bars))
+        return windows
+
+    def walk_forward(self,
+                     stock: StockData,
+                     train_bars: int,
+                     test_bars: int,
+                     step: int = None,
+                     anchored: bool = False,
+                     score: str = 'value'):
+        """
+        Walk-forward optimisation. Each window searches every combination
+        over its train bars, then backtests the best combination over the
+        test bars which follow. Indicators are computed once over the full
+        history and every window backtests views of it, so only the search
+        is repeated. Windows run in the worker pool.
 
-        # Sell signal
-        if signal == 's':
-            # Not holding
-            if hold_value == 0:
-                # print("ignoring invalid sell")
-                continue
+        Parameters:
+        stock (StockData): The stock to optimise over.
+        train_bars (int): Bars in each train window.
+        test_bars (int): Bars in each test window.
+        step (int): Bars between windows, defaulting to test_bars so the
+                    test windows follow each other.
+        anchored (bool): Start every train window at the first bar.
+        score (str): The result column the best combination maximises.
+
+        Yields:
+        dict: The result of each window, in order, as soon as it finishes.
+              Holds the train and test dates, the best parameters, their
+              train score, and their test value, wins, losses, neutral and
+              trades. Combinations which fail or score NaN on the train bars
+              are skipped, and a window without any other combination has
+              None parameters and NaN scores.
+        """
+        grid = self.grid()
+        if len(grid) == 0:
+            raise ValueError("No parameter combinations to walk forward,"
+                             " check ranges and valid")
+        self.prepare(stock, grid)
+        windows = self.windows(stock, train_bars, test_bars, step, anchored)
+
+        if not self.parallel(len(windows) * len(grid)) or len(windows) <= 1:
+            for window in windows:
+                yield walk_forward_window(window, grid, self.strategy, stock, score)
+            return
+
+        # Each worker runs whole windows
+        path = self.share(stock)
+        futures = []
+        try:
+            futures = [self.pool().submit(walk_forward_worker_window, path, window, grid, score)
+                       for window in windows]
+            for future in futures:
+                yield future.result()
+        finally:
+            # Windows already running still need the shared stock
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            os.remove(path)
+
+# Worker process state, set by init_tester_worker and worker_stock
+tester_worker = {}
+
+def init_tester_worker(strategy: Callable, samples: int = 0):
+    # Indicators are precomputed, workers must not write the shared store
+    StockData.STORE_INDICATORS = False
+    tester_worker['strategy'] = strategy
+    tester_worker['samples'] = samples
+
+def worker_stock(path: str) -> StockData:
+    # Load each shared stock once, keeping only the latest
+    if tester_worker.get('path') != path:
+        with open(path, 'rb') as stock_file:
+            tester_worker['stock'] = pickle.load(stock_file)
+        tester_worker['path'] = path
+    return tester_worker['stock']
+
+def backtest_worker_chunk(path: str, grid: list) -> list:
+    return backtest_chunk(grid,
+                          tester_worker['strategy'],
+                          worker_stock(path),
+                          tester_worker['samples'])
+
+def backtest_chunk(grid: list,
+                   strategy: Callable,
+                   stock: StockData,
+                   samples: int = 0) -> list:
+    rows = []
+    for parameters in grid:
+        entries, exits = backtest_strategy(strategy(**parameters), stock)
+        trades, value, wins, losses, neutral = execute(entries, exits, stock)
+        row = {
+            **parameters,
+            'value': value,
+            'wins': wins,
+            'losses': losses,
+            'neutral': neutral,
+            'trades': len(trades),
+            # Removed from the results, kept to store them
+            'parameters': parameters,
+            'metrics': {},
+            'entries': signal_positions(entries, stock.index),
+            'exits': signal_positions(exits, stock.index)
+        }
+        # Seeded so every combination is resampled the same way
+        if samples > 0:
+            row['metrics'] = robustness.summary(trades, samples, seed=0)
+            row.update(row['metrics'])
+        rows.append(row)
+    return rows
+
+def walk_forward_worker_window(path: str, window: tuple, grid: list, score: str) -> dict:
+    return walk_forward_window(window, grid, tester_worker['strategy'], worker_stock(path), score)
+
+def walk_forward_window(window: tuple,
+                        grid: list,
+                        strategy: Callable,
+                        stock: StockData,
+                        score: str) -> dict:
+    train_first, test_first, test_last = window
+    train = stock.view(train_first, test_first)
+    test = stock.view(test_first, test_last)
+    result = {
+        'train_start': train.index[0],
+        'train_end': train.index[-1],
+        'test_start': test.index[0],
+        'test_end': test.index[-1]
+    }
+
+    # Search the train bars, skipping combinations which fail or score NaN
+    candidates = []
+    for parameters in grid:
+        row = try_backtest(parameters, strategy, train)
+        if row is not None and not np.isnan(row[score]):
+            candidates.append(row)
+
+    # Report windows without a candidate rather than dropping them
+    if len(candidates) == 0:
+        print(f"No combination could be backtested from"
+              f" {result['train_start']} to {result['train_end']}")
+        return {
+            **result,
+            **{name: None for name in grid[0]},
+            f"train_{score}": np.nan,
+            'value': np.nan, 'wins': 0, 'losses': 0, 'neutral': 0, 'trades': 0
+        }
 
-            # Calculate outcome of sell
-            outcome = (stock_data.data.loc[date, 'Close'] / hold_value)
+    # Test the best combination
+    best = max(candidates, key=lambda row: row[score])
+    parameters = {name: best[name] for name in grid[0]}
+    tested = try_backtest(parameters, strategy, test)
+    if tested is None:
+        tested = {'value': np.nan, 'wins': 0, 'losses': 0, 'neutral': 0, 'trades': 0}
+
+    return {
+        **result,
+        **parameters,
+        f"train_{score}": best[score],
+        **{key: tested[key] for key in ('value', 'wins', 'losses', 'neutral', 'trades')}
+    }
+
+def try_backtest(parameters: dict, strategy: Callable, stock: StockData) -> dict:
+    # The backtest_chunk row of one combination, or None if it fails
+    try:
+        return backtest_chunk([parameters], strategy, stock)[0]
+    except Exception as e:
+        print(f"Could not backtest {parameters}: {e}")
+        return None
+
+def strategy_identity(strategy) -> tuple:
+    """
+    Returns:
+    tuple: (name, parameters) identifying a strategy and its settings, from
+           its identity() method or else its class and attributes.
+    """
+    if hasattr(strategy, 'identity'):
+        return strategy.identity()
+    kind = type(strategy)
+    return f"{kind.__module__}.{kind.__qualname__}", dict(vars(strategy))
+
+def backtest_strategy(strategy, stock: StockData) -> tuple:
+    """
+    Run any kind of strategy, preferring bar indexes over dates.
+    """
+    if hasattr(strategy, 'backtest_indices'):
+        return strategy.backtest_indices(stock)
+    if hasattr(strategy, 'backtest'):
+        return strategy.backtest(stock)
+    return strategy.run_indices(stock)
+
+# Structured dtype of the trade ledger returned by execute()
+TRADE_DTYPE = np.dtype([
+    ('entry',       np.int64),      # Entry bar index
+    ('exit',        np.int64),      # Exit bar index
+    ('entry_price', np.float64),
+    ('exit_price',  np.float64),
+    ('return',      np.float64),    # exit_price / entry_price - 1
+    ('bars',        np.int64)       # Holding period in bars
+])
+
+class Signals:
+    """
+    Entry or exit signals held as sorted int32 bar positions into the index
+    of a StockData. Dates are only made when asked for, e.g. to print or
+    plot them, so pairing, membership and slicing work on arrays.
+    """
+    def __init__(self, positions, index: pd.DatetimeIndex):
+        """
+        Parameters:
+        positions: Bar indexes, a boolean mask over the bars, dates or
+                   another Signals.
+        index (pd.DatetimeIndex): The index the positions refer to.
+        """
+        self.positions = signal_positions(positions, index).astype(np.int32)
+        self.index     = index
+        self._mask     = None
 
-            losses  += int(outcome < 1)
-            wins    += int(outcome > 1)
-            neutral += int(outcome == 1)
+    @property
+    def mask(self) -> np.ndarray:
+        """
+        Boolean mask over the bars, True where there is a signal.
+        """
+        if self._mask is None:
+            self._mask = np.zeros(len(self.index), dtype=np.bool_)
+            self._mask[self.positions] = True
+        return self._mask
 
-            value *= outcome
-            hold_value = 0
+    def dates(self) -> pd.DatetimeIndex:
+        return self.index[self.positions]
 
-            # print(f"sold at {data.data.loc[date, 'Close']} for {outcome} result")
-            # print()
-    return value, wins, losses, neutral
\ No newline at end of file
+    def between(self, start: int, end: int) -> 'Signals':
+        """
+        Signals on bars start (inclusive) to end (exclusive).
+        """
+        first, last = np.searchsorted(self.positions, (start, end))
+        return Signals(self.positions[first:last], self.index)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.positions if dtype is None else self.positions.astype(dtype)
+
+    def __len__(self) -> int:
+        return self.positions.size
+
+    def __iter__(self):
+        return iter(self.dates())
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return Signals(self.positions[key], self.index)
+        return self.index[self.positions[key]]
+
+    def __contains__(self, item) -> bool:
+        # Dates are looked up in the index, naive dates in its timezone.
+        # Anything else is a bar index.
+        if isinstance(item, (datetime.date, np.datetime64, str)):
+            date = localise(pd.Timestamp(item), self.index)
+            item = self.index.get_indexer([date])[0]
+            if item < 0:
+                return False
+        k = np.searchsorted(self.positions, item)
+        return k < self.positions.size and self.positions[k] == item
+
+    def __repr__(self) -> str:
+        return f"Signals({list(self.dates().strftime('%Y-%m-%d'))})"
+
+def signal_positions(signals, index: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Convert signals given as bar indexes, a boolean mask over the bars or
+    dates into a sorted array of bar indexes.
+    """
+    if isinstance(signals, Signals):
+        return signals.positions.astype(np.int64)
+    signals = np.asarray(signals)
+    if signals.dtype == np.bool_:
+        return np.flatnonzero(signals)
+    if np.issubdtype(signals.dtype, np.integer):
+        return np.sort(signals.astype(np.int64, copy=False), kind='stable')
+    if signals.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    positions = index.get_indexer(pd.DatetimeIndex(signals))
+    if (positions < 0).any():
+        raise ValueError("Signal dates are not in the stock data")
+    return np.sort(positions, kind='stable')
+
+def execute(entries, exits, stock_data: StockData) -> tuple:
+    """
+    Execute entry and exit signals at the close, holding at most one
+    position at a time.
+
+    Parameters:
+    entries: Entry Signals, bar indexes, a boolean mask over the bars, or dates.
+    exits: Exit Signals, bar indexes, a boolean mask over the bars, or dates.
+    stock_data (StockData): The stock the signals are for.
+
+    Returns:
+    tuple: (trades, value, wins, losses, neutral) where trades is a
+           TRADE_DTYPE ledger and value is the compounded outcome.
+    """
+    close = stock_data.array('Close')
+    (trade_entries, trade_exits, outcomes,
+     value, wins, losses, neutral) = kernels.pair_trades(signal_positions(entries, stock_data.index),
+                                                         signal_positions(exits, stock_data.index),
+                                                         close)
+
+    trades = np.empty(trade_entries.size, dtype=TRADE_DTYPE)
+    trades['entry']       = trade_entries
+    trades['exit']        = trade_exits
+    trades['entry_price'] = close[trade_entries]
+    trades['exit_price']  = close[trade_exits]
+    trades['return']      = outcomes - 1
+    trades['bars']        = trade_exits - trade_entries
+
+    return trades, value, wins, losses, neutral
+
+def execute_signals(entries, exits, stock_data: StockData) -> tuple:
+    trades, value, wins, losses, neutral = execute(entries, exits, stock_data)
+    return value, wins, losses, neutral
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import kernels
+
+"""
+Monte Carlo robustness analysis of the trades of a backtest.
+
+The trades are resampled many times, either drawn with replacement
+(bootstrap) or reordered (shuffle), and each sample is replayed as a
+sequence of compounded trades. Every sample is evaluated in one
+batched compiled pass, so this is cheap enough to run on every cell of a
+parameter sweep.
+"""
+
+METHODS = ('bootstrap', 'shuffle')
+
+def trade_returns(trades) -> np.ndarray:
+    # Accept a TRADE_DTYPE ledger from execute() or an array of returns
+    trades = np.asarray(trades)
+    if trades.dtype.names is not None:
+        trades = trades['return']
+    return np.ascontiguousarray(trades, dtype=np.float64)
+
+def sample_order(trades: int,
+                 samples: int,
+                 method: str = 'bootstrap',
+                 seed: int = None) -> np.ndarray:
+    """
+    Returns:
+    np.ndarray: Array of shape (samples, trades) of the trade indexes in
+                each sample.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown resampling method: {method}")
+    rng = np.random.default_rng(seed)
+
+    # Draw trades with replacement
+    if method == 'bootstrap':
+        return rng.integers(0, max(trades, 1), size=(samples, trades))
+
+    # Reorder every trade, which only changes the path and not the final value
+    order = np.broadcast_to(np.arange(trades), (samples, trades))
+    return rng.permuted(order, axis=1)
+
+def resample(trades,
+             samples: int = 10000,
+             method: str = 'bootstrap',
+             seed: int = None) -> pd.DataFrame:
+    """
+    Parameters:
+    trades: The trade ledger from execute(), or the return of each trade.
+    samples (int): The number of resampled sequences.
+    method (str): 'bootstrap' to draw trades with replacement, or 'shuffle'
+                  to reorder them.
+    seed (int): Seed of the random generator, for repeatable results.
+
+    Returns:
+    pd.DataFrame: One row per sample with its final value, max drawdown
+                  and longest losing streak.
+    """
+    returns = trade_returns(trades)
+    order = sample_order(returns.size, samples, method, seed)
+    value, drawdown, losing_streak = kernels.resampled_statistics(returns, order)
+    return pd.DataFrame({
+        'value': value,
+        'drawdown': drawdown,
+        'losing_streak': losing_streak
+    })
+
+def summary(trades,
+            samples: int = 10000,
+            method: str = 'bootstrap',
+            seed: int = None,
+            quantiles: tuple = (0.05, 0.5, 0.95)) -> dict:
+    """
+    Quantiles of each resampled statistic, and the probability of ending
+    below the starting value. Keys are e.g. 'value_5%' or 'drawdown_95%'.
+
+    Parameters:
+    trades: The trade ledger from execute(), or the return of each trade.
+    samples (int): The number of resampled sequences.
+    method (str): 'bootstrap' or 'shuffle'.
+    seed (int): Seed of the random generator, for repeatable results.
+    quantiles (tuple): The quantiles of each statistic to report.
+
+    Returns:
+    dict: The quantiles of the value, drawdown and losing streak, and the
+          probability of a loss.
+    """
+    results = resample(trades, samples, method, seed)
+    quantiles = np.asarray(quantiles)
+
+    statistics = {}
+    for column in results.columns:
+        values = np.quantile(results[column].to_numpy(), quantiles)
+        for quantile, value in zip(quantiles, values):
+            statistics[f"{column}_{quantile * 100:g}%"] = float(value)
+    statistics['loss_probability'] = float(np.mean(results['value'].to_numpy() < 1))
+    return statistics
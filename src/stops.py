@@ -0,0 +1,206 @@
+from typing import Iterable
+import numpy as np
+import kernels
+
+"""
+Vectorised stop losses and take profits.
+
+Each rule computes its whole stop (or target) path over many holding
+periods at once, where a holding period starts at each entry. Trailing
+stops are segmented running maxima which restart at every entry, so
+the exits of every trade are found with a few array operations rather
+than a per-bar loop. Trades held past the next entry, which must skip
+the entries while holding, are followed by a compiled loop instead.
+"""
+
+class Rule:
+    """
+    A stop loss, exiting when the close falls below the path, or a take
+    profit (target = True), exiting when the close rises above it.
+
+    The path is scale * (the highest source since the entry, or the source
+    on the entry bar if not trailing) + offset, see levels().
+    """
+    target = False
+    trailing = True
+
+    def __init__(self, inclusive: bool = False):
+        """
+        Parameters:
+        inclusive (bool): Also exit when the close equals the path.
+        """
+        self.inclusive = inclusive
+
+    def indicators(self) -> list:
+        # Indicators the path is computed from, besides the close
+        return []
+
+    def levels(self, columns: dict) -> tuple:
+        """
+        Parameters:
+        columns (dict): Close and indicator arrays over the bars.
+
+        Returns:
+        tuple: (source, scale, offset) of the path. offset is a float or
+               an array over the bars.
+        """
+        raise NotImplementedError
+
+    def path(self, columns: dict, starts: np.ndarray) -> np.ndarray:
+        """
+        Parameters:
+        columns (dict): Close and indicator arrays over the bars.
+        starts (np.ndarray): Boolean mask of the bars each holding period
+                             starts on, the entries.
+
+        Returns:
+        np.ndarray: The stop or target of each bar.
+        """
+        source, scale, offset = self.levels(columns)
+        source = source.astype(np.float64, copy=False)
+        if self.trailing:
+            level = kernels.segmented_maximum(source, starts)
+        else:
+            segment = np.cumsum(starts) - 1
+            level = np.where(segment >= 0, source[starts][np.maximum(segment, 0)], np.nan)
+        return level * scale + offset
+
+    def exit_mask(self, columns: dict, starts: np.ndarray) -> np.ndarray:
+        close = columns['Close']
+        path = self.path(columns, starts)
+        if self.target:
+            return close >= path if self.inclusive else close > path
+        return close <= path if self.inclusive else close < path
+
+class PercentTrailing(Rule):
+    """
+    Trails a fraction below the highest close since the entry, e.g. the
+    25% stop of solo.sell.
+    """
+    def __init__(self, fraction: float = 0.25, inclusive: bool = False):
+        super().__init__(inclusive)
+        self.fraction = fraction
+
+    def levels(self, columns: dict) -> tuple:
+        return columns['Close'], 1 - self.fraction, 0.0
+
+class AtrTrailing(Rule):
+    """
+    The highest close - ATR * multiplier since the entry, which only ever
+    rises, e.g. the stop of SoloMini.
+    """
+    def __init__(self, multiplier: float = 3, period: int = 14, inclusive: bool = False):
+        super().__init__(inclusive)
+        self.multiplier = multiplier
+        self.atr        = f"atr{period}"
+
+    def indicators(self) -> list:
+        return [self.atr]
+
+    def levels(self, columns: dict) -> tuple:
+        return columns['Close'] - columns[self.atr] * self.multiplier, 1.0, 0.0
+
+class Chandelier(Rule):
+    """
+    ATR * multiplier below the highest high since the entry, using the
+    current ATR.
+    """
+    def __init__(self, multiplier: float = 3, period: int = 22, inclusive: bool = False):
+        super().__init__(inclusive)
+        self.multiplier = multiplier
+        self.atr        = f"atr{period}"
+
+    def indicators(self) -> list:
+        return ['High', self.atr]
+
+    def levels(self, columns: dict) -> tuple:
+        return columns['High'], 1.0, -(columns[self.atr] * self.multiplier)
+
+class TakeProfit(Rule):
+    """
+    A fixed multiple of the entry price, e.g. the 1.2x exit of SoloMini.
+    """
+    target = True
+    trailing = False
+
+    def __init__(self, multiple: float = 1.2, inclusive: bool = False):
+        super().__init__(inclusive)
+        self.multiple = multiple
+
+    def levels(self, columns: dict) -> tuple:
+        return columns['Close'], self.multiple, 0.0
+
+def indicators(rules: Iterable) -> list:
+    names = ['Close']
+    for rule in rules:
+        names.extend(name for name in rule.indicators() if name not in names)
+    return names
+
+def first_exits(columns: dict, entries: np.ndarray, rules: Iterable) -> np.ndarray:
+    """
+    First bar each entry's rules are broken, treating each entry as held
+    until the next entry at most.
+
+    Returns:
+    np.ndarray: The exit bar of each entry, or the number of bars if there
+                is none before the next entry.
+    """
+    bars = len(columns['Close'])
+    starts = np.zeros(bars, dtype=np.bool_)
+    starts[entries] = True
+
+    broken = np.zeros(bars, dtype=np.bool_)
+    for rule in rules:
+        broken |= rule.exit_mask(columns, starts)
+
+    bar = np.where(broken, np.arange(bars), bars)
+    return np.minimum.reduceat(bar, entries)
+
+def exit_indices(columns: dict, entries, rules: Iterable) -> tuple:
+    """
+    Trades taken from entry signals and exited by stop rules, with
+    entries ignored while holding. Exits are checked from the entry bar.
+
+    One pass finds the exits of every trade at once, treating each as
+    held until the next entry at most. Trades up to the first one held
+    past the next entry are independent and kept. From there each trade
+    depends on where the last one exited, so the rest are followed one at
+    a time by kernels.stop_exits in a single pass over the bars.
+
+    Parameters:
+    columns (dict): Close and every indicator the rules use.
+    entries: Sorted entry bar indexes.
+    rules (Iterable): The stop losses and take profits to exit on.
+
+    Returns:
+    tuple: Arrays of the entry and exit bar indexes of the trades taken.
+           The last trade has no exit if it is still held.
+    """
+    rules = list(rules)
+    entries = np.unique(np.asarray(entries, dtype=np.int64))
+    bars = len(columns['Close'])
+    if entries.size == 0:
+        return entries, entries.copy()
+
+    found = first_exits(columns, entries, rules)
+    held = np.flatnonzero(found >= np.append(entries[1:], bars))
+    if held.size == 0:
+        return entries, found[found < bars]
+
+    # Follow the trades from the first one held past the next entry
+    closed = held[0]
+    levels = [rule.levels(columns) for rule in rules]
+    taken, exits = kernels.stop_exits(
+        columns['Close'].astype(np.float64, copy=False),
+        entries[closed:],
+        np.vstack([np.broadcast_to(source, bars) for source, scale, offset in levels]).astype(np.float64),
+        np.array([scale for source, scale, offset in levels], dtype=np.float64),
+        np.vstack([np.broadcast_to(offset, bars) for source, scale, offset in levels]).astype(np.float64),
+        np.array([rule.trailing for rule in rules], dtype=np.bool_),
+        np.array([rule.target for rule in rules], dtype=np.bool_),
+        np.array([rule.inclusive for rule in rules], dtype=np.bool_))
+
+    taken = np.concatenate((entries[:closed], taken))
+    exits = np.concatenate((found[:closed], exits))
+    # Drop the exit placeholder of a last trade which is still held
+    return taken, exits[exits < bars]
@@ -1,47 +1,89 @@
+import numpy as np
+import numba
 import pandas as pd
+import kernels
+import nitolos as nit
 
 def buy_low(boll_low: pd.Series,
             boll_high: pd.Series,
-            close: pd.Series) -> list:
-    buys = []
+            close: pd.Series) -> nit.Signals:
+    buys = buy_low_indices(boll_low.to_numpy(np.float64),
+                           boll_high.to_numpy(np.float64),
+                           close.to_numpy(np.float64))
+    return nit.Signals(buys, close.index)
+
+def sell_high(buys: nit.Signals,
+              boll_low: pd.Series,
+              boll_high: pd.Series,
+              close: pd.Series) -> nit.Signals:
+    sells = sell_high_indices(nit.signal_positions(buys, close.index),
+                              boll_low.to_numpy(np.float64),
+                              boll_high.to_numpy(np.float64),
+                              close.to_numpy(np.float64))
+    return nit.Signals(sells, close.index)
+
+@numba.njit(cache=True)
+def buy_low_indices(boll_low: np.ndarray,
+                    boll_high: np.ndarray,
+                    close: np.ndarray) -> np.ndarray:
+    """
+    Buy when the close touches the lower band, once per trip to the
+    upper band.
+
+    Returns:
+    np.ndarray: Bar indexes of the buys.
+    """
+    buys = np.empty(close.size, dtype=np.int64)
+    count = 0
 
     holding = False
 
-    i = 0
-    end = boll_low.size
-    while i < end:
+    for i in range(close.size):
         # Not currently holding
         if holding is False:
-            if close.iloc[i] <= boll_low.iloc[i]:
+            if close[i] <= boll_low[i]:
                 holding = True
-                buys.append(close.index[i])
+                buys[count] = i
+                count += 1
 
         # Mark as sold
-        if close.iloc[i] >= boll_high.iloc[i]:
+        if close[i] >= boll_high[i]:
             holding = False
 
-    return buys
+    return buys[:count]
 
-def sell_high(buys: list,
-              boll_low: pd.Series,
-              boll_high: pd.Series,
-              close: pd.Series) -> list:
-    sells = []
+@numba.njit(cache=True)
+def sell_high_indices(buys: np.ndarray,
+                      boll_low: np.ndarray,
+                      boll_high: np.ndarray,
+                      close: np.ndarray) -> np.ndarray:
+    """
+    Sell when the close touches the upper band after touching the lower
+    band.
+
+    Returns:
+    np.ndarray: Bar indexes of the sells.
+    """
+    sells = np.empty(close.size, dtype=np.int64)
+    count = 0
 
     holding = False
 
-    i = 0
-    end = boll_low.size
-    while i < end:
+    for i in range(close.size):
         # Holding
         if holding is True:
-            if close.iloc[i] >= boll_high.iloc[i]:
+            if close[i] >= boll_high[i]:
                 holding = False
-                sells.append(close.index[i])
+                sells[count] = i
+                count += 1
 
         # Mark as bought
-        if close.iloc[i] <= boll_low.iloc[i]:
+        if close[i] <= boll_low[i]:
             holding = True
 
-    return sells
+    return sells[:count]
 
+@kernels.warmup
+def warmup():
+    values = kernels.read_only(np.linspace(1.0, 2.0, 8))
+    sell_high_indices(buy_low_indices(values, values, values), values, values, values)
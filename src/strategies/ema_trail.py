@@ -0,0 +1,36 @@
+import numba
+import kernels
+import nitolos as nit
+
+"""
+Ema crossover entry with a percentage trailing stop, written as a
+compiled per-bar rule for nit.CompiledStrategy.
+"""
+
+# Parameter and state layout of rule
+SMALL, LARGE, TRAIL = 0, 1, 2
+CROSSED = 0
+
+@numba.njit
+def rule(i, inputs, parameters, state, position):
+    close, ema_small, ema_large = inputs
+
+    # Only enter on the bar the small ema crosses above the large ema
+    above = ema_small[i] > ema_large[i]
+    crossed = above and state[CROSSED] == 0
+    state[CROSSED] = 1 if above else 0
+
+    if position[kernels.HOLDING] == 0:
+        if crossed:
+            return kernels.ENTER
+        return kernels.HOLD
+
+    # Trail the stop below the highest close since the entry
+    position[kernels.STOP] = position[kernels.PEAK] * (1 - parameters[TRAIL])
+    return kernels.HOLD
+
+def strategy(small: int = 10, large: int = 20, trail: float = 0.1) -> nit.CompiledStrategy:
+    return nit.CompiledStrategy(rule,
+                                ('Close', 'ema{small}', 'ema{large}'),
+                                {'small': small, 'large': large, 'trail': trail},
+                                {'crossed': 1})
@@ -1,4 +1,9 @@
+from typing import Iterable
+import numpy as np
+import numba
 import pandas as pd
+import kernels
+import nitolos as nit
 
 """
 This is the long term ema strategy proposed by Solotin.
@@ -7,72 +12,257 @@ It is also the first strategy Solotin proposed.
 
 def buy(ema_small: pd.Series,
         ema_large: pd.Series,
-        close: pd.Series) -> list:
-    buys = []
+        close: pd.Series) -> nit.Signals:
+    buys = buy_indices(ema_small.to_numpy(np.float64),
+                       ema_large.to_numpy(np.float64),
+                       close.to_numpy(np.float64))
+    return nit.Signals(buys, ema_small.index)
 
-    sixty_day = []
-    sixty_day_high = 0
+def sell(buys: nit.Signals,
+         ema_small: pd.Series,
+         ema_large: pd.Series,
+         close: pd.Series) -> nit.Signals:
+    sells = sell_indices(nit.signal_positions(buys, close.index),
+                         ema_small.to_numpy(np.float64),
+                         ema_large.to_numpy(np.float64),
+                         close.to_numpy(np.float64))
+    return nit.Signals(sells, close.index)
+
+@numba.njit(cache=True)
+def sixty_day_high(close: np.ndarray, period: int = 60) -> np.ndarray:
+    """
+    High of buy's sixty_day buffer at each bar. The buffer holds the last
+    period + 1 closes, and never the first bar.
+    """
+    high = np.full(close.size, np.nan)
+    if close.size > 1:
+        high[1:] = kernels.rolling_extreme(close[1:], period + 1, True)
+    return high
+
+@numba.njit(cache=True)
+def buy_indices(ema_small: np.ndarray,
+                ema_large: np.ndarray,
+                close: np.ndarray) -> np.ndarray:
+    """
+    Array version of buy.
+
+    Returns:
+    np.ndarray: Bar indexes of the buys.
+    """
+    buys = np.empty(close.size, dtype=np.int64)
+    count = 0
+
+    high = sixty_day_high(close)
     last_bought = 0
-    
-    i = 1
-    end = close.size
-    while i < end:
-        # Maintain sixty_day buffer
-        if len(sixty_day) > 60:
-            sixty_day.pop(0)
-        sixty_day.append(close.iloc[i])
-        sixty_day_high = max(sixty_day)
 
+    for i in range(1, close.size):
         # Smaller ema passes larger ema
-        # if ema_small.iloc[i - 1] < ema_large.iloc[i - 1]:
-            # if ema_small.iloc[i] >= ema_large.iloc[i]:
+        # if ema_small[i - 1] < ema_large[i - 1]:
+            # if ema_small[i] >= ema_large[i]:
 
         # Small ema greater than large ema
-        if ema_small.iloc[i] > ema_large.iloc[i]:
+        if ema_small[i] > ema_large[i]:
             # 60 day high
-            if (close.iloc[i] == sixty_day_high):
+            if close[i] == high[i]:
                 # Last time bought was over 20 days ago
                 if (i - last_bought) > 20:
-                    buys.append(ema_small.index[i])
+                    buys[count] = i
+                    count += 1
                     last_bought = i
-        i += 1
 
-    return buys
+    return buys[:count]
 
-def sell(buys: list,
-         ema_small: pd.Series,
-         ema_large: pd.Series,
-         close: pd.Series) -> list:
-    sells = []
+@numba.njit(cache=True)
+def sell_indices(buys: np.ndarray,
+                 ema_small: np.ndarray,
+                 ema_large: np.ndarray,
+                 close: np.ndarray) -> np.ndarray:
+    """
+    Array version of sell.
+
+    Returns:
+    np.ndarray: Bar indexes of the sells.
+    """
+    sells = np.empty(close.size, dtype=np.int64)
+    count = 0
+
+    bought = np.zeros(close.size, dtype=np.bool_)
+    for i in buys:
+        bought[i] = True
 
     trading = False
-    trading_high = 0
+    trading_high = 0.0
 
-    i = 0
-    end = close.size
-    while i < end:
+    for i in range(close.size):
         # Determine trading from buys
-        if close.index[i] in buys:
+        if bought[i]:
             trading = True
-        
+
         # Obtain trading high after buy
         if trading:
-            trading_high = max(trading_high, close.iloc[i])
+            trading_high = max(trading_high, close[i])
 
             # 25% Stop loss exceeded
-            if (trading_high * 0.75) >= close.iloc[i]:
-                sells.append(close.index[i])
+            if (trading_high * 0.75) >= close[i]:
+                sells[count] = i
+                count += 1
                 trading = False
-                trading_high = 0
-
+                trading_high = 0.0
 
         # atr 21 days
         # ATR x 8 (small) or 10 (large)
         # subtract peak since bought
         # that is stop loss
-        
 
-        
-        i += 1
+    return sells[:count]
+
+def sweep(stock: nit.StockData,
+          small_periods: Iterable,
+          large_periods: Iterable,
+          high_period: int = 60,
+          rebuy_period: int = 20,
+          stop_loss: float = 0.25,
+          store: nit.ResultStore = None) -> np.ndarray:
+    """
+    Evaluate buy/sell for every (small ema, large ema) pair at once.
+
+    The EMA bank and the rolling high are computed once, then every pair
+    runs the buy, sell and execution logic fused into a single compiled
+    pass over the bars, with pairs spread over all cores. Values match
+    Strategy(buy, sell, ...).run_and_evaluate() for each pair.
+
+    Parameters:
+    stock (StockData): The stock to evaluate.
+    small_periods (Iterable): Periods of the small ema, the columns of the result.
+    large_periods (Iterable): Periods of the large ema, the rows of the result.
+    high_period (int): Days in the new high lookback of buy.
+    rebuy_period (int): Days which must pass between buys.
+    stop_loss (float): The trailing stop loss fraction of sell.
+    store (ResultStore): Reuse stored values if every pair is stored for the
+                         same bars, otherwise store every pair.
+
+    Returns:
+    np.ndarray: Value of each pair with shape (large, small). NaN where the
+                small period is not less than the large period.
+    """
+    small_periods = np.array(list(small_periods), dtype=np.int64)
+    large_periods = np.array(list(large_periods), dtype=np.int64)
+    invalid = small_periods[np.newaxis, :] >= large_periods[:, np.newaxis]
+
+    # Identify each pair in the store
+    if store is not None:
+        keys = {}
+        for row, large in enumerate(large_periods):
+            for column, small in enumerate(small_periods):
+                if not invalid[row, column]:
+                    keys[row, column] = nit.ResultStore.key(
+                        (f"{__name__}.sweep",
+                         {'small': int(small),
+                          'large': int(large),
+                          'high_period': high_period,
+                          'rebuy_period': rebuy_period,
+                          'stop_loss': stop_loss}),
+                        stock)
+
+        stored = {cell: store.get(key) for cell, key in keys.items()}
+        if all(result is not None for result in stored.values()):
+            values = np.full(invalid.shape, np.nan)
+            for cell, result in stored.items():
+                values[cell] = result['value']
+            return values
+
+    spans = np.union1d(small_periods, large_periods)
+    bank = stock.ema_bank(spans)
+
+    close = stock.array('Close').astype(np.float64, copy=False)
+    high = sixty_day_high(close, high_period)
+
+    # Bank columns of each pair
+    small_index, large_index = np.meshgrid(np.searchsorted(spans, small_periods),
+                                           np.searchsorted(spans, large_periods))
+    values, counts = sweep_kernel(close,
+                                  bank,
+                                  high,
+                                  small_index.ravel(),
+                                  large_index.ravel(),
+                                  rebuy_period,
+                                  1 - stop_loss)
+    values = values.reshape(small_index.shape)
+    counts = counts.reshape(small_index.shape + (4, ))
+    values[invalid] = np.nan
+
+    if store is not None:
+        store.put_many((key, values[cell], *counts[cell], None, None, {})
+                       for cell, key in keys.items())
+    return values
+
+@numba.njit(cache=True, parallel=True)
+def sweep_kernel(close: np.ndarray,
+                 bank: np.ndarray,
+                 high: np.ndarray,
+                 small_index: np.ndarray,
+                 large_index: np.ndarray,
+                 rebuy_period: int,
+                 stop_fraction: float) -> tuple:
+    """
+    Returns:
+    tuple: The value of each pair, and its wins, losses, neutral and trades.
+    """
+    pairs = small_index.size
+    values = np.empty(pairs, dtype=np.float64)
+    counts = np.zeros((pairs, 4), dtype=np.int64)
+
+    # Pairs are independent, each runs sequentially over the bars
+    for p in numba.prange(pairs):
+        small = small_index[p]
+        large = large_index[p]
+        last_bought = 0
+        trading = False
+        trading_high = 0.0
+        hold_value = 0.0
+        value = 1.0
+
+        for i in range(close.size):
+            # buy
+            bought = False
+            if (i > 0
+            and bank[i, small] > bank[i, large]
+            and close[i] == high[i]
+            and (i - last_bought) > rebuy_period):
+                bought = True
+                last_bought = i
+
+            # sell
+            sold = False
+            if bought:
+                trading = True
+            if trading:
+                trading_high = max(trading_high, close[i])
+                if (trading_high * stop_fraction) >= close[i]:
+                    sold = True
+                    trading = False
+                    trading_high = 0.0
+
+            # Execute, entries before exits on the same bar
+            if bought and hold_value == 0:
+                hold_value = close[i]
+            if sold and hold_value != 0:
+                outcome = close[i] / hold_value
+                counts[p, 0] += outcome > 1
+                counts[p, 1] += outcome < 1
+                counts[p, 2] += outcome == 1
+                counts[p, 3] += 1
+                value *= outcome
+                hold_value = 0.0
+
+        values[p] = value
+
+    return values, counts
 
-    return sells
+@kernels.warmup
+def warmup():
+    values = kernels.read_only(np.linspace(1.0, 2.0, 8))
+    index = np.zeros(1, dtype=np.int64)
+    sell_indices(buy_indices(values, values, values), values, values, values)
+    high = sixty_day_high(values, 60)
+    sweep_kernel(values, np.ones((values.size, 1)), high, index, index, 2, 0.75)
@@ -1,4 +1,8 @@
+from collections import deque
+import numpy as np
+import numba
 import pandas as pd
+import kernels
 import nitolos as nit
 
 class SoloMini:
@@ -48,25 +52,87 @@ class SoloMini:
         self.atr_period               = atr_period
         self.atr_stop_loss_multiplier = atr_stop_loss_multiplier
 
-    def backtest(self, stock: nit.StockData, show_output: bool = False) -> tuple[list]:
-        if show_output: print("Beginning SoloMini Backtest")
-        indicators = [
+    def indicators(self) -> list:
+        return [
             "ema" + str(self.small_ema_period),
             "ema" + str(self.large_ema_period),
             "atr" + str(self.atr_period),
             "ema50",
-            "ema100"
+            "ema100",
+            "high" + str(self.high_lookback_period + 1)
         ]
 
+    def backtest(self,
+                 stock: nit.StockData,
+                 show_output: bool = False,
+                 reference: bool = False,
+                 store: nit.ResultStore = None) -> tuple:
+        """
+        Parameters:
+        store (ResultStore): Reuse the stored signals of these parameters on
+                             the same bars if there are any, otherwise store them.
+
+        Returns:
+        tuple: The entry and exit Signals.
+        """
+        stored = None
+        if store is not None and not reference:
+            key = nit.ResultStore.key(self, stock)
+            stored = store.get(key)
+
+        if stored is not None and stored['entries'] is not None:
+            if show_output: print("Using stored SoloMini Backtest")
+            entries, exits = stored['entries'], stored['exits']
+        else:
+            entries, exits = self.backtest_indices(stock, show_output, reference)
+            if store is not None and not reference:
+                trades, value, wins, losses, neutral = nit.execute(entries, exits, stock)
+                store.put(key, value, wins, losses, neutral, len(trades), entries, exits)
+
+        return (nit.Signals(entries, stock.index),
+                nit.Signals(exits, stock.index))
+
+    def backtest_indices(self,
+                         stock: nit.StockData,
+                         show_output: bool = False,
+                         reference: bool = False) -> tuple:
+        """
+        Parameters:
+        stock (StockData): The stock to backtest.
+        show_output (bool): Print progress.
+        reference (bool): Use the pure Python implementation, to verify the
+                          compiled kernel against.
+
+        Returns:
+        tuple: Arrays of the entry and exit bar indexes.
+        """
+        if show_output: print("Beginning SoloMini Backtest")
+        indicators = self.indicators()
+
         if show_output: print("Preprocessing indicators...")
         stock.preprocess_indicators(indicators)
         if show_output: print("Preprocessed indicators.")
 
         if show_output: print("Backtesting strategy")
+        if reference:
+            result = self.backtest_reference(stock)
+        else:
+            result = backtest_kernel(stock.array('Close'),
+                                     *stock.array(indicators),
+                                     float(self.volatility_filter),
+                                     int(self.volatility_period),
+                                     float(self.atr_stop_loss_multiplier))
+        if show_output: print("Finished backtest")
+
+        return result
+
+    def backtest_reference(self, stock: nit.StockData) -> tuple:
+        # The lookback high is sliced from the closes rather than read from
+        # the high indicator, so the rolling kernel is checked as well
         lookback_index = 0
         lookback_high = 0
         close = stock['Close']
-        ema_small, ema_large, atr, ema_50, ema_100 = stock[*indicators]
+        ema_small, ema_large, atr, ema_50, ema_100 = stock[*self.indicators()[:5]]
         stop_loss = 0
         entries = []
         exits = []
@@ -92,7 +158,7 @@ class SoloMini:
                     if (close.iloc[i] == lookback_high):
                         if not (close.iloc[i] > (1 + self.volatility_filter) * volatile_price):
                             if (ema_50.iloc[i] > ema_100.iloc[i]):
-                                entries.append(close.index[i])
+                                entries.append(i)
                                 stop_loss = 0
                                 hold_price = close.iloc[i]
                                 holding = True
@@ -101,14 +167,133 @@ class SoloMini:
             if (holding is True):
                 stop_loss = max(stop_loss, nit.StopLoss.atr_long(close.iloc[i], atr.iloc[i], self.atr_stop_loss_multiplier))
                 if (close.iloc[i] < stop_loss) or (close.iloc[i] > 1.2 * hold_price):
-                    exits.append(close.index[i])
+                    exits.append(i)
                     hold_price = 0
                     holding = False
 
             i += 1
-            
-        
-        if show_output: print("Finished backtest")
 
-        return (entries, exits)
-    
\ No newline at end of file
+        return (np.array(entries, dtype=np.int64),
+                np.array(exits, dtype=np.int64))
+
+    def online(self) -> 'SoloMiniState':
+        """
+        State for running the strategy one bar at a time, e.g. with
+        streaming.stream().
+        """
+        return SoloMiniState(self)
+
+class SoloMiniState:
+    """
+    SoloMini's state between bars, producing the same entries and exits as
+    backtest_kernel when updated with each bar in turn.
+    """
+    def __init__(self, strategy: SoloMini):
+        (self.ema_small,
+         self.ema_large,
+         self.atr,
+         self.ema_50,
+         self.ema_100,
+         self.high) = strategy.indicators()
+        self.volatility_filter        = strategy.volatility_filter
+        self.atr_stop_loss_multiplier = strategy.atr_stop_loss_multiplier
+
+        # Closes back to volatility_period bars ago
+        self.closes     = deque(maxlen=strategy.volatility_period + 1)
+        self.stop_loss  = 0.0
+        self.hold_price = 0.0
+        self.holding    = False
+
+    def update(self, bar: dict) -> tuple:
+        """
+        Parameters:
+        bar (dict): The bar's close and the value of each indicator.
+
+        Returns:
+        tuple: Whether to enter and whether to exit on this bar.
+        """
+        close = bar['Close']
+        self.closes.append(close)
+        volatile_price = self.closes[0]
+        entry = False
+        exit = False
+
+        # Entry conditions
+        if not self.holding:
+            if (bar[self.ema_small] > bar[self.ema_large]
+            and close == bar[self.high]
+            and not (close > (1 + self.volatility_filter) * volatile_price)
+            and bar[self.ema_50] > bar[self.ema_100]):
+                entry = True
+                self.stop_loss = 0.0
+                self.hold_price = close
+                self.holding = True
+
+        # Exit conditions
+        if self.holding:
+            atr_stop = close - bar[self.atr] * self.atr_stop_loss_multiplier
+            if atr_stop > self.stop_loss:
+                self.stop_loss = atr_stop
+            if (close < self.stop_loss) or (close > 1.2 * self.hold_price):
+                exit = True
+                self.hold_price = 0.0
+                self.holding = False
+
+        return entry, exit
+
+@numba.njit(cache=True)
+def backtest_kernel(close: np.ndarray,
+                    ema_small: np.ndarray,
+                    ema_large: np.ndarray,
+                    atr: np.ndarray,
+                    ema_50: np.ndarray,
+                    ema_100: np.ndarray,
+                    high: np.ndarray,
+                    volatility_filter: float,
+                    volatility_period: int,
+                    atr_stop_loss_multiplier: float) -> tuple:
+    """
+    Compiled SoloMini.backtest_reference, producing identical entries and exits.
+    """
+    end = close.size
+    entries = np.empty(end, dtype=np.int64)
+    exits = np.empty(end, dtype=np.int64)
+    entry_count = 0
+    exit_count = 0
+    stop_loss = 0.0
+    hold_price = 0.0
+    holding = False
+
+    for i in range(end):
+        volatile_price = close[max(i - volatility_period, 0)]
+
+        # Entry conditions
+        if not holding:
+            if (ema_small[i] > ema_large[i]
+            and close[i] == high[i]
+            and not (close[i] > (1 + volatility_filter) * volatile_price)
+            and ema_50[i] > ema_100[i]):
+                entries[entry_count] = i
+                entry_count += 1
+                stop_loss = 0.0
+                hold_price = close[i]
+                holding = True
+
+        # Exit conditions
+        if holding:
+            # Same as max(stop_loss, StopLoss.atr_long(...)), ignoring NaN
+            atr_stop = close[i] - atr[i] * atr_stop_loss_multiplier
+            if atr_stop > stop_loss:
+                stop_loss = atr_stop
+            if (close[i] < stop_loss) or (close[i] > 1.2 * hold_price):
+                exits[exit_count] = i
+                exit_count += 1
+                hold_price = 0.0
+                holding = False
+
+    return entries[:entry_count], exits[:exit_count]
+
+@kernels.warmup
+def warmup():
+    values = kernels.read_only(np.linspace(1.0, 2.0, 8))
+    backtest_kernel(values, values, values, values, values, values, values, 0.1, 1, 3.0)
@@ -1,44 +1,74 @@
+import numpy as np
+import numba
 import pandas as pd
+import kernels
+import nitolos as nit
 
 def buy(dema: pd.Series,
-        close: pd.Series) -> list:
-    buys = []
+        close: pd.Series) -> nit.Signals:
+    buys = buy_indices(dema.to_numpy(np.float64), close.to_numpy(np.float64))
+    return nit.Signals(buys, close.index)
+
+def sell(buys: nit.Signals,
+         dema: pd.Series,
+         close: pd.Series) -> nit.Signals:
+    sells = sell_indices(nit.signal_positions(buys, close.index),
+                         dema.to_numpy(np.float64),
+                         close.to_numpy(np.float64))
+    return nit.Signals(sells, close.index)
+
+@numba.njit(cache=True)
+def buy_indices(dema: np.ndarray,
+                close: np.ndarray) -> np.ndarray:
+    """
+    Buy when the derivative turns non-negative.
+
+    Returns:
+    np.ndarray: Bar indexes of the buys.
+    """
+    buys = np.empty(close.size, dtype=np.int64)
+    count = 0
 
     upwards = False
-    
-    i = 1
-    end = close.size
-    while i < end:
-        if dema.iloc[i] >= 0 and upwards is False:
+
+    for i in range(1, close.size):
+        if dema[i] >= 0 and upwards is False:
             upwards = True
-            buys.append(close.index[i])
+            buys[count] = i
+            count += 1
 
-        if dema.iloc[i] < 0:
+        if dema[i] < 0:
             upwards = False
-        
-        i += 1
 
-    return buys
+    return buys[:count]
 
-def sell(buys: list,
-         dema: pd.Series,
-         close: pd.Series) -> list:
-    sells = []
+@numba.njit(cache=True)
+def sell_indices(buys: np.ndarray,
+                 dema: np.ndarray,
+                 close: np.ndarray) -> np.ndarray:
+    """
+    Sell when the derivative turns non-positive.
+
+    Returns:
+    np.ndarray: Bar indexes of the sells.
+    """
+    sells = np.empty(close.size, dtype=np.int64)
+    count = 0
 
     upwards = False
 
-    i = 0
-    end = close.size
-    while i < end:
-        if dema.iloc[i] <= 0 and upwards is True:
+    for i in range(close.size):
+        if dema[i] <= 0 and upwards is True:
             upwards = False
-            sells.append(close.index[i])
-            
-        if dema.iloc[i] > 0:
-            upwards = True
+            sells[count] = i
+            count += 1
 
-        i += 1
-
-    return sells
+        if dema[i] > 0:
+            upwards = True
 
+    return sells[:count]
 
+@kernels.warmup
+def warmup():
+    values = kernels.read_only(np.linspace(-1.0, 1.0, 8))
+    sell_indices(buy_indices(values, values), values, values)
@@ -0,0 +1,159 @@
+from typing import Iterable
+import os
+import time
+import datetime
+import numpy as np
+import pandas as pd
+import indicators as ind
+import nitolos as nit
+
+"""
+Event-driven backtests over streams of bars.
+
+A bar source is any iterable of (date, bar) pairs, where bar is a dict of
+the bar's values keyed by column. Sources here replay a StockData or a
+file one bar at a time, simulate a feed, or poll a DataSource for new
+bars, so the same strategy runs historical replays and paper trading.
+
+stream() updates the indicator and strategy state with each bar and
+yields signals as they occur. Nothing is kept per bar, so memory is
+constant however long the stream runs.
+"""
+
+def replay(stock: nit.StockData):
+    """
+    Replay the downloaded columns of a StockData one bar at a time.
+    """
+    columns = {column: stock.array(column) for column in stock.raw_columns}
+    for i, date in enumerate(stock.index):
+        yield date, {column: values[i] for column, values in columns.items()}
+
+def frame_bars(data: pd.DataFrame, after: pd.Timestamp = None):
+    # Bars of a frame, skipping any at or before `after`
+    if after is not None:
+        data = data[data.index > after]
+    columns = {column: data[column].to_numpy() for column in data.columns}
+    for i, date in enumerate(data.index):
+        yield date, {column: values[i] for column, values in columns.items()}
+
+def file_bars(path: str, chunksize: int = 10000):
+    """
+    Stream the bars of a cache file, or any file in a CACHE_BACKENDS
+    format. csv files are read chunksize rows at a time and segmented
+    caches one segment at a time, so the file is never fully loaded.
+    """
+    root, file_type = os.path.splitext(path)
+    backend = nit.CACHE_BACKENDS[file_type]
+    last = None
+
+    if backend is nit.CsvCache:
+        for chunk in pd.read_csv(path, index_col=0, chunksize=chunksize):
+            chunk.index = nit.CsvCache.parse_index(chunk.index)
+            for date, bar in frame_bars(chunk, last):
+                last = date
+                yield date, bar
+        return
+
+    # Segments may repeat rows if a compaction was interrupted
+    for segment_path in [path] + backend.segment_paths(path):
+        for date, bar in frame_bars(backend.read(segment_path), last):
+            last = date
+            yield date, bar
+
+def cache_bars(ticker: str, chunksize: int = 10000):
+    """
+    Stream the cached bars of a ticker, e.g. to replay its history without
+    creating a StockData.
+    """
+    return file_bars(nit.StockData.CACHE_DIR + ticker + nit.StockData.CACHE_TYPE,
+                     chunksize)
+
+def simulated_bars(start: datetime.datetime = None,
+                   price: float = 10.0,
+                   drift: float = 0.0,
+                   volatility: float = 0.02,
+                   bars: int = None,
+                   seed: int = None):
+    """
+    A simulated feed of business day bars following a random walk.
+
+    Parameters:
+    start (datetime): Date of the first bar, defaulting to today.
+    price (float): Close before the first bar.
+    drift (float): Mean daily return.
+    volatility (float): Standard deviation of the daily return.
+    bars (int): The number of bars, None for an endless feed.
+    seed (int): Seed of the random generator, for repeatable feeds.
+    """
+    rng = np.random.default_rng(seed)
+    date = pd.Timestamp(start if start is not None else datetime.date.today())
+    count = 0
+    while bars is None or count < bars:
+        # Skip weekends
+        while date.weekday() >= 5:
+            date += pd.Timedelta(days=1)
+
+        open_price = price
+        price *= 1 + rng.normal(drift, volatility)
+        spread = abs(rng.normal(0, volatility / 2))
+        yield date, {
+            'Open': open_price,
+            'High': max(open_price, price) * (1 + spread),
+            'Low': min(open_price, price) * (1 - spread),
+            'Close': price,
+            'Volume': int(rng.integers(1000, 100000))
+        }
+        date += pd.Timedelta(days=1)
+        count += 1
+
+def live_bars(source: nit.DataSource,
+              ticker: str,
+              start: datetime.datetime = None,
+              poll_seconds: float = 60):
+    """
+    Poll a DataSource for new bars and yield each one once, for paper
+    trading. Never finishes, so stop it by breaking out of the loop.
+
+    Parameters:
+    source (DataSource): Where to download bars from, e.g. YahooSource().
+    ticker (str): The ticker code.
+    start (datetime): The first date to yield bars from, defaulting to today.
+    poll_seconds (float): Seconds to wait between downloads.
+    """
+    if start is None:
+        start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    last = None
+    while True:
+        since = start if last is None else last.to_pydatetime().replace(tzinfo=None)
+        for date, bar in frame_bars(source.history(ticker, since), last):
+            last = date
+            yield date, bar
+        time.sleep(poll_seconds)
+
+def stream(strategy, bars: Iterable, columns: dict = None):
+    """
+    Run a strategy over a stream of bars, one bar at a time.
+
+    Parameters:
+    strategy: Provides indicators(), the names of the indicators it uses,
+              and online(), which returns its state. The state's
+              update(bar) takes the bar with its indicators and returns
+              whether to enter and whether to exit, e.g. SoloMini.
+    bars (Iterable): (date, bar) pairs, e.g. from replay() or live_bars().
+    columns (dict): Batch computed columns to continue the indicators from,
+                    e.g. StockData.columns. None to start from nothing.
+
+    Yields:
+    tuple: (date, signal, bar) for each signal as it occurs, where signal
+           is 'entry' or 'exit' and bar holds the bar and its indicators.
+    """
+    indicators = ind.OnlineIndicators(strategy.indicators(), columns)
+    state = strategy.online()
+
+    for date, bar in bars:
+        values = indicators.update(bar)
+        entry, exit = state.update(values)
+        if entry:
+            yield date, 'entry', values
+        if exit:
+            yield date, 'exit', values
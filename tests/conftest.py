@@ -0,0 +1,64 @@
+import os
+import sys
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import nitolos as nit
+
+class FrameSource(nit.DataSource):
+    """
+    Serves history from a DataFrame so tests never touch the network.
+    `data` may be replaced between loads to simulate new bars arriving.
+    """
+    def __init__(self, data: pd.DataFrame):
+        self.data = data
+        self.calls = []
+
+    def history(self,
+                ticker: str,
+                start: datetime.datetime,
+                end: datetime.datetime = None) -> pd.DataFrame:
+        self.calls.append((ticker, start, end))
+        data = self.data
+        if len(data) == 0:
+            return data
+        mask = data.index >= nit.localise(start, data.index)
+        if end is not None:
+            mask &= data.index < nit.localise(end, data.index)
+        return data[mask]
+
+def make_bars(first: str = '2015-01-01',
+              periods: int = 600,
+              seed: int = 0) -> pd.DataFrame:
+    # Random walk business day bars in the exchange timezone, like Yahoo Finance
+    index = pd.date_range(first, periods=periods, freq='B',
+                          tz='Australia/Sydney', name='Date')
+    rng = np.random.default_rng(seed)
+    close = np.cumprod(1 + rng.normal(0, 0.02, periods)) * 10
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.005, periods)),
+        'High': close * (1 + np.abs(rng.normal(0, 0.01, periods))),
+        'Low': close * (1 - np.abs(rng.normal(0, 0.01, periods))),
+        'Close': close,
+        'Volume': rng.integers(1, 1000, periods),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0
+    }, index=index)
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # StockData caches relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def bars() -> pd.DataFrame:
+    return make_bars()
+
+@pytest.fixture
+def source(bars) -> FrameSource:
+    return FrameSource(bars)
@@ -0,0 +1,44 @@
+import datetime
+import numpy as np
+import pandas as pd
+import nitolos as nit
+from conftest import FrameSource
+
+def test_npz_round_trip(bars):
+    nit.NpzCache.save('CBA.npz', bars)
+    loaded = nit.NpzCache.load('CBA.npz')
+    pd.testing.assert_frame_equal(loaded, bars, check_freq=False)
+    assert str(loaded.index.tz) == 'Australia/Sydney'
+
+def test_npz_empty_download():
+    # yfinance returns an empty frame with an object index for unknown tickers
+    empty = pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'],
+                         index=pd.Index([], dtype=object),
+                         dtype=float)
+    nit.NpzCache.save('XXX.npz', empty)
+    loaded = nit.NpzCache.load('XXX.npz')
+    assert len(loaded) == 0
+    assert isinstance(loaded.index, pd.DatetimeIndex)
+
+    stock = nit.StockData('XXX', datetime.datetime(2015, 1, 1),
+                          source=FrameSource(empty))
+    assert len(stock) == 0
+
+def test_cache_indicators_round_trip(source, monkeypatch):
+    monkeypatch.setattr(nit.StockData, 'CACHE_INDICATORS', True)
+    stock = nit.StockData('CBA', datetime.datetime(2015, 1, 1), source=source)
+    stock.preprocess_indicators(['ema20', 'atr14'])
+
+    reloaded = nit.StockData('CBA', datetime.datetime(2015, 1, 1),
+                             source=source, refresh=False)
+    for column in ('ema20', 'atr14'):
+        assert column in reloaded.columns
+        np.testing.assert_array_equal(reloaded.array(column), stock.array(column))
+
+def test_indicators_not_cached_by_default(source):
+    stock = nit.StockData('CBA', datetime.datetime(2015, 1, 1), source=source)
+    stock.preprocess_indicators(['ema20'])
+
+    reloaded = nit.StockData('CBA', datetime.datetime(2015, 1, 1),
+                             source=source, refresh=False)
+    assert 'ema20' not in reloaded.columns
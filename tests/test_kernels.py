@@ -0,0 +1,56 @@
+import datetime
+import numpy as np
+from numba.core.registry import CPUDispatcher
+import nitolos as nit
+import kernels
+import indicators
+import robustness
+import stops
+from strategies import solo, solo_mini, test1, boll
+from conftest import FrameSource, make_bars
+
+MODULES = (kernels, indicators, robustness, stops, solo, solo_mini, test1, boll)
+
+def signatures() -> dict:
+    return {f"{module.__name__}.{name}": len(function.signatures)
+            for module in MODULES
+            for name, function in vars(module).items()
+            if isinstance(function, CPUDispatcher)}
+
+def test_precompile_covers_real_use():
+    nit.precompile()
+    compiled = {name: count for name, count in signatures().items() if count > 0}
+
+    stock = nit.StockData('CBA', datetime.datetime(2015, 1, 1),
+                          source=FrameSource(make_bars(periods=400)))
+    stock.preprocess_indicators(['ema20', 'd_ema200', 'atr14', 'boll20,2.0',
+                                 'high61', 'low20', 'sma50', 'std20'])
+    entries, exits = solo_mini.SoloMini(10, 20).backtest(stock)
+    trades, *_ = nit.execute(entries, exits, stock)
+    robustness.summary(trades, 20, seed=0)
+
+    for strategy in (nit.Strategy(solo.buy_indices, solo.sell_indices,
+                                  ('ema10', 'ema20', 'Close'), ('ema10', 'ema20', 'Close'),
+                                  indices=True),
+                     nit.Strategy(test1.buy_indices, test1.sell_indices,
+                                  ('ema10', 'ema20'), ('ema10', 'ema20'),
+                                  indices=True)):
+        strategy.run_and_evaluate(stock)
+    solo.sweep(stock, range(5, 20, 5), range(20, 50, 10))
+    nit.StopLoss.exits(stock, entries, (stops.AtrTrailing(3),
+                                        stops.TakeProfit(1.2),
+                                        stops.Chandelier(3)))
+
+    after = signatures()
+    grown = {name: (count, after[name]) for name, count in compiled.items()
+             if after[name] != count}
+    assert grown == {}
+
+def test_columns_are_read_only(source):
+    stock = nit.StockData('CBA', datetime.datetime(2015, 1, 1), source=source)
+    stock.preprocess_indicators(['ema20', 'atr14'])
+    for column in ('Close', 'ema20', 'atr14'):
+        assert not stock.array(column).flags.writeable
+        assert stock.array(column).flags.c_contiguous
+    stock.astype(np.float32)
+    assert not stock.array('Close').flags.writeable
@@ -0,0 +1,76 @@
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+import nitolos as nit
+
+START = datetime.datetime(2015, 1, 1)
+
+def next_day():
+    # Pretend the cache was last refreshed on an earlier day
+    with open('cache/CBA.json') as info_file:
+        info = json.load(info_file)
+    info['refresh-date'] = '2000-01-01'
+    with open('cache/CBA.json', 'w') as info_file:
+        json.dump(info, info_file)
+
+def assert_bars(stock, expected):
+    cached = stock.data[['Open', 'High', 'Low', 'Close', 'Volume']]
+    np.testing.assert_array_equal(stock.index.asi8, expected.index.asi8)
+    np.testing.assert_array_equal(cached.to_numpy(),
+                                  expected[cached.columns].to_numpy())
+
+def test_refresh_appends_new_bars(bars, source):
+    source.data = bars.iloc[:400]
+    nit.StockData('CBA', START, source=source)
+
+    next_day()
+    source.data = bars.iloc[:450]
+    stock = nit.StockData('CBA', START, source=source)
+    assert_bars(stock, bars.iloc[:450])
+    # Only the new bars are written
+    assert os.path.exists('cache/CBA.1.npz')
+    assert_bars(nit.StockData('CBA', START, source=source, refresh=False),
+                bars.iloc[:450])
+
+def test_refresh_replaces_partial_last_bar(bars, source):
+    # The last bar was downloaded during trading
+    partial = bars.iloc[:400].copy()
+    partial.iloc[-1, partial.columns.get_loc('Close')] *= 1.01
+    partial.iloc[-1, partial.columns.get_loc('Volume')] //= 2
+    source.data = partial
+    nit.StockData('CBA', START, source=source)
+
+    next_day()
+    source.data = bars.iloc[:410]
+    stock = nit.StockData('CBA', START, source=source)
+    assert_bars(stock, bars.iloc[:410])
+    assert_bars(nit.StockData('CBA', START, source=source, refresh=False),
+                bars.iloc[:410])
+
+def test_refresh_after_split(bars, source):
+    source.data = bars.iloc[:400]
+    nit.StockData('CBA', START, source=source)
+
+    # A 2:1 split within the new bars adjusts all earlier prices
+    split = bars.iloc[:450].copy()
+    prices = ['Open', 'High', 'Low', 'Close']
+    split.iloc[:420, [split.columns.get_loc(c) for c in prices]] /= 2
+    split.iloc[420, split.columns.get_loc('Stock Splits')] = 2.0
+
+    next_day()
+    source.data = split
+    stock = nit.StockData('CBA', START, source=source)
+    assert_bars(stock, split)
+    assert_bars(nit.StockData('CBA', START, source=source, refresh=False), split)
+
+def test_refreshed_today_is_not_stale(bars, source):
+    source.data = bars.iloc[:400]
+    nit.StockData('CBA', START, source=source)
+    calls = len(source.calls)
+
+    source.data = bars
+    stock = nit.StockData('CBA', START, source=source)
+    assert len(source.calls) == calls
+    assert len(stock) == 400
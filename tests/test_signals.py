@@ -0,0 +1,45 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import nitolos as nit
+
+@pytest.fixture
+def signals(bars) -> nit.Signals:
+    return nit.Signals(np.array([3, 10, 42]), bars.index)
+
+def test_contains_positions(signals):
+    assert 10 in signals
+    assert np.int64(42) in signals
+    assert 11 not in signals
+    assert 10_000 not in signals
+
+@pytest.mark.parametrize('date', [
+    '2015-01-15',
+    datetime.datetime(2015, 1, 15),
+    datetime.date(2015, 1, 15),
+    np.datetime64('2015-01-15'),
+    pd.Timestamp('2015-01-15', tz='Australia/Sydney'),
+    pd.Timestamp('2015-01-15', tz='Australia/Sydney').tz_convert('UTC'),
+    pd.Timestamp('2015-01-15', tz='Australia/Sydney').to_pydatetime()
+])
+def test_contains_dates(signals, date):
+    # Bar 10 is 2015-01-15
+    assert signals.index[10] == pd.Timestamp('2015-01-15', tz='Australia/Sydney')
+    assert date in signals
+
+@pytest.mark.parametrize('date', [
+    '2015-01-16',
+    datetime.datetime(2015, 1, 16),
+    datetime.date(2015, 1, 16),
+    np.datetime64('2015-01-16'),
+    datetime.date(1990, 1, 1)
+])
+def test_not_contains_dates(signals, date):
+    assert date not in signals
+
+def test_contains_naive_index(bars):
+    signals = nit.Signals(np.array([10]), bars.index.tz_localize(None))
+    assert datetime.datetime(2015, 1, 15) in signals
+    assert datetime.date(2015, 1, 15) in signals
+    assert np.datetime64('2015-01-15') in signals
@@ -0,0 +1,29 @@
+import datetime
+import numpy as np
+import nitolos as nit
+from strategies.solo_mini import SoloMini
+
+def test_numpy_and_python_parameters_share_a_key(source):
+    stock = nit.StockData('CBA', datetime.datetime(2015, 1, 1), source=source)
+    store = nit.ResultStore('results.sqlite')
+
+    assert (nit.ResultStore.key(SoloMini(np.int64(10), np.int64(20), volatility_filter=np.float32(0.5)), stock)
+         == nit.ResultStore.key(SoloMini(10, 20, volatility_filter=0.5), stock))
+
+    key = nit.ResultStore.key(('sweep', {'small': np.int64(5), 'large': np.int32(20),
+                                         'flag': np.bool_(True)}), stock)
+    store.put(key, 1.5, 3, 2, 0, 5)
+    same = nit.ResultStore.key(('sweep', {'small': 5, 'large': 20, 'flag': True}), stock)
+    assert same == key
+    assert store.get(same)['value'] == 1.5
+
+def test_backtest_is_memoised(source):
+    stock = nit.StockData('CBA', datetime.datetime(2015, 1, 1), source=source)
+    store = nit.ResultStore('results.sqlite')
+    entries, exits = SoloMini(np.int64(10), np.int64(20)).backtest(stock, store=store)
+    assert len(store.query(ticker='CBA')) == 1
+
+    stored_entries, stored_exits = SoloMini(10, 20).backtest(stock, store=store)
+    assert len(store.query(ticker='CBA')) == 1
+    np.testing.assert_array_equal(stored_entries.positions, entries.positions)
+    np.testing.assert_array_equal(stored_exits.positions, exits.positions)
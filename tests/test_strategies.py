@@ -0,0 +1,21 @@
+import datetime
+import numpy as np
+import pytest
+import nitolos as nit
+from strategies.solo_mini import SoloMini
+from conftest import FrameSource, make_bars
+
+@pytest.mark.parametrize('parameters', [
+    {},
+    {'small_ema_period': 5, 'large_ema_period': 30, 'high_lookback_period': 10},
+    {'volatility_filter': 0.02, 'volatility_period': 3, 'atr_stop_loss_multiplier': 1.5}
+])
+def test_solo_mini_matches_reference(parameters):
+    stock = nit.StockData('CBA', datetime.datetime(2015, 1, 1),
+                          source=FrameSource(make_bars(periods=1500, seed=3)))
+    strategy = SoloMini(**parameters)
+    entries, exits = strategy.backtest_indices(stock)
+    reference_entries, reference_exits = strategy.backtest_indices(stock, reference=True)
+    assert len(entries) > 0
+    np.testing.assert_array_equal(entries, reference_entries)
+    np.testing.assert_array_equal(exits, reference_exits)
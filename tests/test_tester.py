@@ -0,0 +1,66 @@
+import os
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import nitolos as nit
+from strategies.solo_mini import SoloMini
+from conftest import FrameSource, make_bars
+
+RANGES = (('small_ema_period', [5, 10, 15]),
+          ('large_ema_period', [20, 30, 50]))
+
+def load(ticker: str, seed: int) -> nit.StockData:
+    return nit.StockData(ticker, datetime.datetime(2015, 1, 1),
+                         source=FrameSource(make_bars(periods=900, seed=seed)))
+
+def test_pool_is_reused(monkeypatch):
+    monkeypatch.setattr(nit.NitolosTester, 'MIN_PARALLEL_BACKTESTS', 1)
+    first, second = load('CBA', 1), load('BHP', 2)
+    serial = nit.NitolosTester(SoloMini, RANGES, max_workers=1)
+
+    with nit.NitolosTester(SoloMini, RANGES, max_workers=2) as tester:
+        pd.testing.assert_frame_equal(tester.backtest(first), serial.backtest(first))
+        executor = tester.executor
+        # A different stock in the same pool
+        pd.testing.assert_frame_equal(tester.backtest(second), serial.backtest(second))
+        assert list(tester.walk_forward(first, 300, 200)) == list(serial.walk_forward(first, 300, 200))
+        assert tester.executor is executor
+        directory = tester.directory
+    assert tester.executor is None
+    assert not os.path.exists(directory)
+
+def test_small_grids_run_serially():
+    tester = nit.NitolosTester(SoloMini, RANGES, max_workers=4)
+    assert len(tester.backtest(load('CBA', 1))) == 9
+    assert tester.executor is None
+
+class Flaky:
+    # SoloMini with a large ema period, which fails for negative periods
+    def __init__(self, period: int):
+        self.period = period
+
+    def backtest_indices(self, stock: nit.StockData) -> tuple:
+        if self.period < 0:
+            raise ValueError("Negative period")
+        return SoloMini(5, self.period).backtest_indices(stock)
+
+def test_walk_forward_empty_grid():
+    tester = nit.NitolosTester(SoloMini, RANGES, valid=lambda parameters: False)
+    with pytest.raises(ValueError):
+        list(tester.walk_forward(load('CBA', 1), 300, 200))
+
+def test_walk_forward_skips_failing_combinations():
+    stock = load('CBA', 1)
+    flaky = nit.NitolosTester(Flaky, (('period', [-1, 20, 30]), ), max_workers=1)
+    working = nit.NitolosTester(Flaky, (('period', [20, 30]), ), max_workers=1)
+    assert list(flaky.walk_forward(stock, 300, 200)) == list(working.walk_forward(stock, 300, 200))
+
+def test_walk_forward_reports_windows_without_candidates():
+    tester = nit.NitolosTester(Flaky, (('period', [-1, -2]), ), max_workers=1)
+    windows = list(tester.walk_forward(load('CBA', 1), 300, 200))
+    assert len(windows) == 3
+    for window in windows:
+        assert window['period'] is None
+        assert np.isnan(window['train_value'])
+        assert np.isnan(window['value'])